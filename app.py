@@ -1,15 +1,18 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
 import os
 import json
 import datetime
 import uuid
 import tempfile
 import shutil
-from pdf_processor_fixed import extract_text_from_pdf, extract_structured_data_from_text, connect_db, initialize_aws_clients, normalize_field
+import hashlib
+import html
+from collections import Counter
+from pdf_processor_fixed import extract_text_from_pdf, extract_structured_data_from_text, rule_based_extraction, connect_db, create_indexes, create_sales_summaries, rebuild_sales_summaries, initialize_aws_clients, normalize_field, resolve_product_ids, generate_imeis
+from db_pool import ConnectionPool
 
 # Set page configuration
 st.set_page_config(
@@ -20,143 +23,612 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        color: #1E88E5;
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-    .sub-header {
-        font-size: 1.8rem;
-        color: #0D47A1;
-        margin-top: 2rem;
-        margin-bottom: 1rem;
-    }
-    .card {
-        background-color: #f9f9f9;
-        border-radius: 10px;
-        padding: 20px;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-        margin-bottom: 20px;
-    }
-    .metric-card {
-        background-color: #e3f2fd;
-        border-radius: 10px;
-        padding: 15px;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-        text-align: center;
-    }
-    .metric-value {
-        font-size: 2rem;
-        font-weight: bold;
-        color: #1565C0;
-    }
-    .metric-label {
-        font-size: 1rem;
-        color: #424242;
-    }
-    .highlight {
-        background-color: #ffecb3;
-        padding: 2px 5px;
-        border-radius: 3px;
-    }
-    .free-item-alert {
-        background-color: #e8f5e9;
-        border-left: 5px solid #4caf50;
-        padding: 15px;
-        margin: 10px 0;
-        border-radius: 5px;
-    }
-    .scheme-card {
-        background-color: #f5f5f5;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 15px;
-        border-left: 4px solid #2196F3;
-    }
-    .approval-pending {
-        border-left: 4px solid #FFC107;
-    }
-    .approval-approved {
-        border-left: 4px solid #4CAF50;
-    }
-    .approval-rejected {
-        border-left: 4px solid #F44336;
-    }
-    .edit-mode {
-        background-color: #fff8e1;
-    }
-    .table-container {
-        overflow-x: auto;
-    }
-    .stButton>button {
-        background-color: #1976D2;
-        color: white;
-        font-weight: 500;
-    }
-    .stButton>button:hover {
-        background-color: #1565C0;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_data
+def load_css(css_path):
+    """Read the app stylesheet once per server process"""
+    with open(css_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+css_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'styles.css')
+st.markdown(f"<style>{load_css(css_path)}</style>", unsafe_allow_html=True)
 
 # Load secrets
+@st.cache_data(show_spinner=False)
+def read_secrets_file(secrets_path):
+    """Read and parse a secrets file once, until the settings page rewrites it"""
+    with open(secrets_path, 'r') as f:
+        return json.load(f)
+
 def load_secrets():
     """Load AWS and API secrets from secrets.json"""
     current_dir = os.path.dirname(os.path.abspath(__file__))
     secrets_path = os.path.join(current_dir, 'secrets.json')
     
     try:
-        with open(secrets_path, 'r') as f:
-            return json.load(f)
+        return read_secrets_file(secrets_path)
     except Exception as e:
         st.error(f"Error loading secrets: {e}")
         return {}
 
-# Initialize session state
-def init_session_state():
-    """Initialize session state variables"""
-    if 'page' not in st.session_state:
-        st.session_state.page = 'dashboard'
-    
-    if 'edit_mode' not in st.session_state:
-        st.session_state.edit_mode = False
-    
-    if 'edited_scheme' not in st.session_state:
-        st.session_state.edited_scheme = None
-    
-    if 'edited_products' not in st.session_state:
-        st.session_state.edited_products = None
-    
-    if 'approval_requests' not in st.session_state:
-        st.session_state.approval_requests = []
-    
-    if 'notifications' not in st.session_state:
-        st.session_state.notifications = []
+# AWS clients
+@st.cache_resource(show_spinner=False)
+def get_aws_clients(secrets):
+    """Create the Bedrock and Textract clients once per set of credentials"""
+    return initialize_aws_clients(secrets)
+
+# Connection pool
+@st.cache_resource
+def get_db_pool():
+    """Create the SQLite connection pool shared across reruns and sessions"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    pool = ConnectionPool(os.path.join(current_dir, 'dns_database.db'))
     
-    if 'selected_scheme_id' not in st.session_state:
-        st.session_state.selected_scheme_id = None
+    # Make sure the indexes exist and the query planner has fresh statistics
+    try:
+        with pool.borrow() as conn:
+            create_indexes(conn.cursor())
+            create_sales_summaries(conn.cursor())
+            conn.execute("ANALYZE")
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"Error preparing database indexes: {e}")
     
-    if 'selected_dealer_id' not in st.session_state:
-        st.session_state.selected_dealer_id = None
+    return pool
+
+# Cached lookups
+@st.cache_data(ttl=60, show_spinner=False)
+def get_active_schemes():
+    """Get active schemes for the simulation selectors"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT scheme_id, scheme_name FROM schemes WHERE deal_status = 'Active' LIMIT 10")
+        schemes = [dict(row) for row in cursor]
+    return schemes
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_active_dealers():
+    """Get active dealers with the attributes used for offer matching"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT dealer_id, dealer_name, dealer_type, region, state, city FROM dealers WHERE is_active = 1")
+        dealers = [dict(row) for row in cursor]
+    return dealers
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_scheme_products_for_sale(scheme_id):
+    """Get the active products of a scheme along with their payout details"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT p.product_id, p.product_name,
+               COALESCE(p.dealer_price_dp, 10000.0) AS dealer_price_dp,
+               COALESCE(sp.payout_amount, 0.0) AS payout_amount,
+               COALESCE(sp.payout_type, 'Fixed') AS payout_type,
+               sp.free_item_description
+        FROM products p
+        JOIN scheme_products sp ON p.product_id = sp.product_id
+        WHERE sp.scheme_id = ? AND p.is_active = 1
+        """, (scheme_id,))
+        products = [dict(row) for row in cursor]
+    return products
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_product_categories():
+    """Get the categories of active products"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT product_category FROM products WHERE is_active = 1")
+        categories = [row[0] for row in cursor]
+    return categories
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_products_for_sale(category):
+    """Get the active products of a category for the cart"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT product_id, product_name, product_code, ram, storage, color, dealer_price_dp, mrp
+        FROM products
+        WHERE product_category = ? AND is_active = 1
+        ORDER BY product_name
+        """, (category,))
+        products = [tuple(row) for row in cursor]
+    return products
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_distinct_values(table, column):
+    """Get the distinct non-null values of a column for the filter selectors"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL")
+        values = [row[0] for row in cursor]
+    return values
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_pending_approval_count():
+    """Get the number of scheme approvals waiting for a decision"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM scheme_approvals WHERE approval_status = 'Pending'")
+        pending_count = cursor.fetchone()[0]
+    return pending_count
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_all_schemes():
+    """Get every scheme, newest first, for the scheme explorer"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM schemes ORDER BY upload_timestamp DESC")
+        schemes = [dict(row) for row in cursor]
+    return schemes
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_product_listing():
+    """Get the displayed columns of every active product, with categorical filter columns"""
+    with get_db_pool().borrow() as conn:
+        product_df = pd.read_sql_query("""
+        SELECT product_name, product_code, product_category, product_subcategory,
+               ram, storage, connectivity, color, dealer_price_dp, mrp
+        FROM products
+        WHERE is_active = 1
+        ORDER BY product_name
+        """, conn, dtype_backend="pyarrow")
     
-    if 'selected_product_id' not in st.session_state:
-        st.session_state.selected_product_id = None
+    # The categories double as the sorted filter options
+    filter_columns = ['product_category', 'ram', 'storage']
+    product_df[filter_columns] = product_df[filter_columns].astype('category')
+    return product_df
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_dealer_listing():
+    """Get the displayed columns of every active dealer, with categorical filter columns"""
+    with get_db_pool().borrow() as conn:
+        dealer_df = pd.read_sql_query("""
+        SELECT dealer_name, dealer_code, dealer_type, region, state, city,
+               contact_person, contact_email, contact_phone
+        FROM dealers
+        WHERE is_active = 1
+        ORDER BY dealer_name
+        """, conn, dtype_backend="pyarrow")
+    
+    # The categories double as the sorted filter options
+    filter_columns = ['dealer_type', 'region', 'state']
+    dealer_df[filter_columns] = dealer_df[filter_columns].astype('category')
+    return dealer_df
+
+def clear_cached_queries():
+    """Invalidate cached lookups after schemes, products or dealers change"""
+    get_active_schemes.clear()
+    get_active_dealers.clear()
+    get_scheme_products_for_sale.clear()
+    get_product_categories.clear()
+    get_products_for_sale.clear()
+    get_distinct_values.clear()
+    get_pending_approval_count.clear()
+    get_all_schemes.clear()
+    get_product_listing.clear()
+    get_dealer_listing.clear()
+    clear_sales_queries()
+
+# Scheme queries
+@st.cache_data(ttl=300, show_spinner=False)
+def get_scheme_details(scheme_id):
+    """Get a scheme with its products, rules, parameters and sales performance"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        
+        # Read everything from one snapshot of the database
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("SELECT * FROM schemes WHERE scheme_id = ?", (scheme_id,))
+            scheme = cursor.fetchone()
+            
+            if not scheme:
+                return None
+            
+            cursor.execute("""
+            SELECT sp.*, p.product_name, p.product_category, p.ram, p.storage, p.color
+            FROM scheme_products sp
+            JOIN products p ON sp.product_id = p.product_id
+            WHERE sp.scheme_id = ?
+            """, (scheme_id,))
+            products = [dict(row) for row in cursor]
+            
+            cursor.execute("SELECT * FROM scheme_rules WHERE scheme_id = ?", (scheme_id,))
+            rules = [dict(row) for row in cursor]
+            
+            cursor.execute("SELECT * FROM scheme_parameters WHERE scheme_id = ?", (scheme_id,))
+            parameters = [dict(row) for row in cursor]
+            
+            performance = pd.read_sql_query("""
+            SELECT p.product_name, COUNT(st.sale_id) as sales_count, SUM(st.earned_dealer_incentive_amount) as total_incentive
+            FROM sales_transactions st
+            JOIN products p ON st.product_id = p.product_id
+            WHERE st.scheme_id = ?
+            GROUP BY p.product_id
+            ORDER BY total_incentive DESC
+            """, conn, params=(scheme_id,))
+            performance.columns = ['Product', 'Sales Count', 'Total Incentive']
+        finally:
+            conn.rollback()
     
-    # New – Cart Mode defaults
-    cart_defaults = {
-        "cart_items": [],
-        "selected_offer": None,
-        "available_offers": []
+    return {
+        'scheme': dict(scheme),
+        'products': products,
+        'rules': rules,
+        'parameters': parameters,
+        'performance': performance
     }
-    for k, v in cart_defaults.items():
-        if k not in st.session_state:
-            st.session_state[k] = v
 
-    if 'billing_date' not in st.session_state:
-        st.session_state.billing_date = datetime.date.today()
+# Dashboard queries
+@st.cache_data(ttl=60, show_spinner=False)
+def get_dashboard_metrics():
+    """Get the active scheme, product and dealer counts and the total number of sales"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT (SELECT COUNT(*) FROM schemes WHERE deal_status = 'Active'),
+               (SELECT COUNT(*) FROM products WHERE is_active = 1),
+               (SELECT COUNT(*) FROM dealers WHERE is_active = 1),
+               (SELECT COUNT(*) FROM sales_transactions)
+        """)
+        metrics = tuple(cursor.fetchone())
+    return metrics
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_scheme_performance():
+    """Get sales count and incentive totals of the top active schemes"""
+    with get_db_pool().borrow() as conn:
+        scheme_df = pd.read_sql_query("""
+        SELECT s.scheme_name, COALESCE(m.sales_count, 0) as sales_count, m.total_incentive
+        FROM schemes s
+        LEFT JOIN mv_scheme_sales m ON s.scheme_id = m.scheme_id
+        WHERE s.deal_status = 'Active'
+        ORDER BY total_incentive DESC
+        LIMIT 10
+        """, conn)
+    scheme_df.columns = ['Scheme', 'Sales Count', 'Total Incentive']
+    return scheme_df
+
+def unique_labels(names, ids):
+    """Suffix names that occur more than once with their id, so chart labels stay distinct"""
+    counts = Counter(names)
+    return [f"{name} (#{item_id})" if counts[name] > 1 else name for name, item_id in zip(names, ids)]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_product_scheme_performance():
+    """Get sales counts of the busiest products across the busiest active schemes, one column per scheme"""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
+        
+        # Fix the scheme columns first
+        cursor.execute("""
+        SELECT s.scheme_id, s.scheme_name
+        FROM mv_scheme_sales m
+        JOIN schemes s ON m.scheme_id = s.scheme_id
+        WHERE s.deal_status = 'Active'
+        ORDER BY m.sales_count DESC
+        LIMIT 20
+        """)
+        schemes = cursor.fetchall()
+        
+        if not schemes:
+            return pd.DataFrame()
+        
+        # Pivot the product rows into those columns with conditional sums
+        scheme_ids = [scheme['scheme_id'] for scheme in schemes]
+        scheme_columns = ", ".join("SUM(CASE WHEN m.scheme_id = ? THEN m.sales_count ELSE 0 END)" for _ in scheme_ids)
+        placeholders = ", ".join("?" for _ in scheme_ids)
+        
+        product_scheme_df = pd.read_sql_query(f"""
+        SELECT p.product_id, p.product_name, {scheme_columns}
+        FROM mv_product_scheme_sales m
+        JOIN products p ON m.product_id = p.product_id
+        WHERE p.is_active = 1 AND m.scheme_id IN ({placeholders})
+        GROUP BY p.product_id
+        ORDER BY SUM(m.sales_count) DESC
+        LIMIT 30
+        """, conn, params=scheme_ids * 2)
+    
+    # Products and schemes are grouped by id, so keep repeated names apart in the labels
+    scheme_labels = unique_labels([scheme['scheme_name'] for scheme in schemes], scheme_ids)
+    product_labels = unique_labels(product_scheme_df['product_name'].tolist(), product_scheme_df['product_id'].tolist())
+    
+    product_scheme_df = product_scheme_df.drop(columns=['product_id', 'product_name'])
+    product_scheme_df.columns = scheme_labels
+    product_scheme_df.index = pd.Index(product_labels, name='Product')
+    return product_scheme_df
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_regional_performance():
+    """Get sales count and incentive totals per dealer region"""
+    with get_db_pool().borrow() as conn:
+        region_df = pd.read_sql_query("""
+        SELECT d.region, SUM(m.sales_count) as sales_count, SUM(m.total_incentive) as total_incentive
+        FROM dealers d
+        JOIN mv_dealer_sales m ON d.dealer_id = m.dealer_id
+        GROUP BY d.region
+        ORDER BY total_incentive DESC
+        """, conn)
+    region_df.columns = ['Region', 'Sales Count', 'Total Incentive']
+    return region_df
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_recent_sales(limit=10):
+    """Get the most recent sales transactions for the activity table"""
+    with get_db_pool().borrow() as conn:
+        sales_df = pd.read_sql_query("""
+        SELECT st.sale_id, d.dealer_name, p.product_name, s.scheme_name, 
+               st.quantity_sold, st.earned_dealer_incentive_amount,
+               strftime('%Y-%m-%d %H:%M', st.sale_timestamp)
+        FROM sales_transactions st
+        JOIN dealers d ON st.dealer_id = d.dealer_id
+        JOIN products p ON st.product_id = p.product_id
+        JOIN schemes s ON st.scheme_id = s.scheme_id
+        ORDER BY st.sale_timestamp DESC
+        LIMIT ?
+        """, conn, params=(limit,), dtype_backend="pyarrow")
+    sales_df.columns = [
+        'Sale ID', 'Dealer', 'Product', 'Scheme', 
+        'Quantity', 'Incentive Amount', 'Timestamp'
+    ]
+    return sales_df
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_product_performance():
+    """Get sales count and incentive totals of the top active products"""
+    with get_db_pool().borrow() as conn:
+        perf_df = pd.read_sql_query("""
+        SELECT p.product_name, COALESCE(m.sales_count, 0) as sales_count, m.total_incentive
+        FROM products p
+        LEFT JOIN mv_product_sales m ON p.product_id = m.product_id
+        WHERE p.is_active = 1
+        ORDER BY m.total_incentive DESC
+        LIMIT 15
+        """, conn)
+    perf_df.columns = ['Product', 'Sales Count', 'Total Incentive']
+    return perf_df
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_dealer_performance():
+    """Get sales count and incentive totals of the top active dealers"""
+    with get_db_pool().borrow() as conn:
+        perf_df = pd.read_sql_query("""
+        SELECT d.dealer_name, COALESCE(m.sales_count, 0) as sales_count, m.total_incentive
+        FROM dealers d
+        LEFT JOIN mv_dealer_sales m ON d.dealer_id = m.dealer_id
+        WHERE d.is_active = 1
+        ORDER BY m.total_incentive DESC
+        LIMIT 15
+        """, conn)
+    perf_df.columns = ['Dealer', 'Sales Count', 'Total Incentive']
+    return perf_df
+
+def clear_sales_queries():
+    """Invalidate cached sales aggregates after sales are recorded"""
+    get_dashboard_metrics.clear()
+    get_scheme_details.clear()
+    get_scheme_performance.clear()
+    get_product_scheme_performance.clear()
+    get_regional_performance.clear()
+    get_recent_sales.clear()
+    get_product_performance.clear()
+    get_dealer_performance.clear()
+
+# Cached PDF extraction: failures raise and no UI is drawn inside, so only clean results are cached
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+def extract_pdf_pages(file_hash, file_path, _textract_client, ocr_cache_dir=None):
+    """Extract page texts from an uploaded PDF, cached by the hash of its contents"""
+    return extract_text_from_pdf(file_path, _textract_client, ocr_cache_dir, strict=True, show_progress=False)
+
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+def extract_scheme_data(text, document_name, _bedrock_client, inference_profile_arn):
+    """Extract structured scheme data from document text, cached by the text"""
+    return extract_structured_data_from_text(text, document_name, _bedrock_client, inference_profile_arn, fallback=False)
+
+# Chart figures, cached on their input frames so reruns reuse them
+@st.cache_resource(max_entries=32)
+def build_scheme_performance_fig(scheme_df):
+    """Build the scheme effectiveness bar chart"""
+    import plotly.express as px
+    
+    scheme_df = scheme_df.fillna(0)  # Replace NaN with 0
+    
+    # Create bar chart
+    fig = px.bar(
+        scheme_df,
+        x='Scheme',
+        y='Total Incentive',
+        color='Sales Count',
+        labels={'Total Incentive': 'Total Incentive Amount (₹)', 'Scheme': 'Scheme Name'},
+        title='Top Performing Schemes by Incentive Amount',
+        color_continuous_scale=px.colors.sequential.Blues
+    )
+    
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        height=500,
+        margin=dict(l=20, r=20, t=40, b=100)
+    )
+    
+    fig.update_traces(marker_line_width=0)
+    
+    return fig
+
+@st.cache_resource(max_entries=32)
+def build_product_heatmap_fig(product_scheme_df):
+    """Build the product by scheme sales heatmap from the pivoted sales counts"""
+    import plotly.express as px
+    
+    # Create heatmap
+    fig = px.imshow(
+        product_scheme_df,
+        labels=dict(x="Scheme", y="Product", color="Sales Count"),
+        x=product_scheme_df.columns,
+        y=product_scheme_df.index,
+        color_continuous_scale='Blues',
+        title='Product Performance by Scheme'
+    )
+    
+    fig.update_layout(
+        height=600,
+        margin=dict(l=20, r=20, t=40, b=20)
+    )
+    
+    return fig
+
+@st.cache_resource(max_entries=32)
+def build_regional_performance_fig(region_df):
+    """Build the regional incentive pie chart"""
+    import plotly.express as px
+    
+    region_df = region_df.fillna(0)  # Replace NaN with 0
+    
+    # Create pie chart
+    fig = px.pie(
+        region_df,
+        values='Total Incentive',
+        names='Region',
+        title='Incentive Distribution by Region',
+        color_discrete_sequence=px.colors.sequential.Blues_r
+    )
+    
+    fig.update_layout(
+        height=500,
+        margin=dict(l=20, r=20, t=40, b=20)
+    )
+    
+    return fig
+
+@st.cache_resource(max_entries=32)
+def build_scheme_product_performance_fig(perf_df):
+    """Build the product performance bar chart of one scheme"""
+    import plotly.express as px
+    
+    # Create bar chart
+    fig = px.bar(
+        perf_df,
+        x='Product',
+        y='Total Incentive',
+        color='Sales Count',
+        labels={'Total Incentive': 'Total Incentive Amount (₹)', 'Product': 'Product Name'},
+        title='Product Performance in this Scheme',
+        color_continuous_scale=px.colors.sequential.Blues
+    )
+    
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        height=500,
+        margin=dict(l=20, r=20, t=40, b=100)
+    )
+    
+    fig.update_traces(marker_line_width=0)
+    
+    return fig
+
+@st.cache_resource(max_entries=32)
+def build_product_performance_fig(perf_df):
+    """Build the top products bar chart"""
+    import plotly.express as px
+    
+    perf_df = perf_df.fillna(0)  # Replace NaN with 0
+    
+    # Create bar chart
+    fig = px.bar(
+        perf_df,
+        x='Product',
+        y='Total Incentive',
+        color='Sales Count',
+        labels={'Total Incentive': 'Total Incentive Amount (₹)', 'Product': 'Product Name'},
+        title='Top Performing Products by Incentive Amount',
+        color_continuous_scale=px.colors.sequential.Blues
+    )
+    
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        height=500,
+        margin=dict(l=20, r=20, t=40, b=100)
+    )
+    
+    fig.update_traces(marker_line_width=0)
+    
+    return fig
+
+@st.cache_resource(max_entries=32)
+def build_dealer_performance_fig(perf_df):
+    """Build the top dealers bar chart"""
+    import plotly.express as px
+    
+    perf_df = perf_df.fillna(0)  # Replace NaN with 0
+    
+    # Create bar chart
+    fig = px.bar(
+        perf_df,
+        x='Dealer',
+        y='Total Incentive',
+        color='Sales Count',
+        labels={'Total Incentive': 'Total Incentive Amount (₹)', 'Dealer': 'Dealer Name'},
+        title='Top Performing Dealers by Incentive Amount',
+        color_continuous_scale=px.colors.sequential.Blues
+    )
+    
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        height=500,
+        margin=dict(l=20, r=20, t=40, b=100)
+    )
+    
+    fig.update_traces(marker_line_width=0)
+    
+    return fig
+
+@st.cache_resource(max_entries=32)
+def build_sales_trend_fig(trend_df):
+    """Build the daily sales trend line chart"""
+    import plotly.express as px
+    
+    # Create line chart
+    fig = px.line(
+        trend_df,
+        x='Date',
+        y=['Incentive Amount', 'Sales Count'],
+        labels={'value': 'Value', 'variable': 'Metric'},
+        title='Sales Trend Over Time',
+        color_discrete_sequence=['#1976D2', '#FFC107'],
+        render_mode='webgl'
+    )
+    
+    fig.update_layout(
+        height=400,
+        margin=dict(l=20, r=20, t=40, b=20),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        uirevision='sales_trend'  # Keep zoom and pan across reruns
+    )
+    
+    return fig
+
+# Initialize session state
+def init_session_state():
+    """Initialize session state variables"""
+    # Built per call so each session gets its own mutable defaults
+    defaults = {
+        'page': 'dashboard',
+        'edit_mode': False,
+        'edited_scheme': None,
+        'edited_products': None,
+        'approval_requests': [],
+        'notifications': [],
+        'selected_scheme_id': None,
+        'selected_dealer_id': None,
+        'selected_product_id': None,
+        # New – Cart Mode defaults
+        'cart_items': [],
+        'selected_offer': None,
+        'available_offers': [],
+        'billing_date': datetime.date.today()
+    }
+    for k, v in defaults.items():
+        st.session_state.setdefault(k, v)
 
 # Navigation
 def render_sidebar():
@@ -190,11 +662,7 @@ def render_sidebar():
     st.sidebar.subheader("Approvals")
     
     # Check for pending approvals
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM scheme_approvals WHERE approval_status = 'Pending'")
-    pending_count = cursor.fetchone()[0]
-    conn.close()
+    pending_count = get_pending_approval_count()
     
     if pending_count > 0:
         if st.sidebar.button(f"⏳ Pending Approvals ({pending_count})", key="nav_approvals"):
@@ -210,32 +678,27 @@ def render_sidebar():
     if st.sidebar.button("❓ Help", key="nav_help"):
         st.session_state.page = 'help'
     
+    # Recompute the sales summaries and drop cached query results, e.g. after editing the database outside the app
+    if st.sidebar.button("🔄 Refresh Data", key="refresh_data"):
+        try:
+            with get_db_pool().borrow() as conn:
+                rebuild_sales_summaries(conn.cursor())
+                conn.commit()
+        except sqlite3.Error as e:
+            st.sidebar.error(f"Error rebuilding sales summaries: {str(e)}")
+        clear_cached_queries()
+    
     # Display current date
     st.sidebar.markdown("---")
     current_date = datetime.datetime.now().strftime("%B %d, %Y")
     st.sidebar.markdown(f"**Current Date:** {current_date}")
 
 # Dashboard
-def render_dashboard():
-    """Render the main dashboard"""
-    st.markdown("<h1 class='main-header'>Dealer Nudging System Dashboard</h1>", unsafe_allow_html=True)
-    
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
-    
+@st.fragment
+def render_dashboard_metrics():
+    """Render the summary metric cards"""
     # Get summary metrics
-    cursor.execute("SELECT COUNT(*) FROM schemes WHERE deal_status = 'Active'")
-    active_schemes = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM products WHERE is_active = 1")
-    active_products = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM dealers WHERE is_active = 1")
-    active_dealers = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM sales_transactions")
-    total_sales = cursor.fetchone()[0]
+    active_schemes, active_products, active_dealers, total_sales = get_dashboard_metrics()
     
     # Display metrics in a row
     col1, col2, col3, col4 = st.columns(4)
@@ -263,306 +726,213 @@ def render_dashboard():
         st.markdown(f"<div class='metric-value'>{total_sales}</div>", unsafe_allow_html=True)
         st.markdown("<div class='metric-label'>Total Sales</div>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
-    
+
+@st.fragment
+def render_scheme_effectiveness():
+    """Render the scheme effectiveness chart"""
     # Scheme effectiveness analysis
     st.markdown("<h2 class='sub-header'>Scheme Effectiveness Analysis</h2>", unsafe_allow_html=True)
     
     try:
         # Get scheme performance data
-        cursor.execute("""
-        SELECT s.scheme_name, COUNT(st.sale_id) as sales_count, SUM(st.earned_dealer_incentive_amount) as total_incentive
-        FROM schemes s
-        LEFT JOIN sales_transactions st ON s.scheme_id = st.scheme_id
-        WHERE s.deal_status = 'Active'
-        GROUP BY s.scheme_id
-        ORDER BY total_incentive DESC
-        LIMIT 10
-        """)
+        scheme_df = get_scheme_performance()
         
-        scheme_performance = cursor.fetchall()
-        
-        if scheme_performance and len(scheme_performance) > 0:
-            # Convert to DataFrame
-            scheme_df = pd.DataFrame(scheme_performance, columns=['Scheme', 'Sales Count', 'Total Incentive'])
-            scheme_df = scheme_df.fillna(0)  # Replace NaN with 0
-            
-            # Create bar chart
-            fig = px.bar(
-                scheme_df,
-                x='Scheme',
-                y='Total Incentive',
-                color='Sales Count',
-                labels={'Total Incentive': 'Total Incentive Amount (₹)', 'Scheme': 'Scheme Name'},
-                title='Top Performing Schemes by Incentive Amount',
-                color_continuous_scale=px.colors.sequential.Blues
-            )
-            
-            fig.update_layout(
-                xaxis_tickangle=-45,
-                height=500,
-                margin=dict(l=20, r=20, t=40, b=100)
-            )
+        if not scheme_df.empty:
+            fig = build_scheme_performance_fig(scheme_df)
             
             st.plotly_chart(fig, use_container_width=True, key="scheme_performance_chart")
         else:
             st.info("No scheme performance data available yet. Start recording sales to see this chart.")
     except Exception as e:
         st.error(f"Error generating scheme effectiveness chart: {str(e)}")
-    
+
+@st.fragment
+def render_product_heatmap():
+    """Render the product performance heatmap"""
     # Product performance heatmap
     st.markdown("<h2 class='sub-header'>Product Performance Heatmap</h2>", unsafe_allow_html=True)
     
     try:
         # Get product performance by scheme
-        cursor.execute("""
-        SELECT p.product_name, s.scheme_name, COUNT(st.sale_id) as sales_count
-        FROM products p
-        JOIN sales_transactions st ON p.product_id = st.product_id
-        JOIN schemes s ON st.scheme_id = s.scheme_id
-        WHERE p.is_active = 1 AND s.deal_status = 'Active'
-        GROUP BY p.product_id, s.scheme_id
-        ORDER BY sales_count DESC
-        LIMIT 50
-        """)
-        
-        product_scheme_performance = cursor.fetchall()
+        product_scheme_df = get_product_scheme_performance()
         
-        if product_scheme_performance and len(product_scheme_performance) > 0:
-            # Convert to DataFrame
-            product_scheme_df = pd.DataFrame(product_scheme_performance, columns=['Product', 'Scheme', 'Sales Count'])
-            
-            # Create pivot table for heatmap
-            pivot_df = product_scheme_df.pivot_table(
-                values='Sales Count',
-                index='Product',
-                columns='Scheme',
-                fill_value=0
-            )
-            
-            # Create heatmap
-            fig = px.imshow(
-                pivot_df,
-                labels=dict(x="Scheme", y="Product", color="Sales Count"),
-                x=pivot_df.columns,
-                y=pivot_df.index,
-                color_continuous_scale='Blues',
-                title='Product Performance by Scheme'
-            )
-            
-            fig.update_layout(
-                height=600,
-                margin=dict(l=20, r=20, t=40, b=20)
-            )
+        if not product_scheme_df.empty:
+            fig = build_product_heatmap_fig(product_scheme_df)
             
             st.plotly_chart(fig, use_container_width=True, key="product_heatmap_chart")
         else:
             st.info("No product performance data available yet. Start recording sales to see this heatmap.")
     except Exception as e:
         st.error(f"Error generating product performance heatmap: {str(e)}")
-    
+
+@st.fragment
+def render_regional_performance():
+    """Render the regional performance chart"""
     # Regional performance
     st.markdown("<h2 class='sub-header'>Regional Performance</h2>", unsafe_allow_html=True)
     
     try:
         # Get regional performance data
-        cursor.execute("""
-        SELECT d.region, COUNT(st.sale_id) as sales_count, SUM(st.earned_dealer_incentive_amount) as total_incentive
-        FROM dealers d
-        JOIN sales_transactions st ON d.dealer_id = st.dealer_id
-        GROUP BY d.region
-        ORDER BY total_incentive DESC
-        """)
-        
-        regional_performance = cursor.fetchall()
+        region_df = get_regional_performance()
         
-        if regional_performance and len(regional_performance) > 0:
-            # Convert to DataFrame
-            region_df = pd.DataFrame(regional_performance, columns=['Region', 'Sales Count', 'Total Incentive'])
-            region_df = region_df.fillna(0)  # Replace NaN with 0
-            
-            # Create pie chart
-            fig = px.pie(
-                region_df,
-                values='Total Incentive',
-                names='Region',
-                title='Incentive Distribution by Region',
-                color_discrete_sequence=px.colors.sequential.Blues_r
-            )
-            
-            fig.update_layout(
-                height=500,
-                margin=dict(l=20, r=20, t=40, b=20)
-            )
+        if not region_df.empty:
+            fig = build_regional_performance_fig(region_df)
             
             st.plotly_chart(fig, use_container_width=True, key="regional_performance_chart")
         else:
             st.info("No regional performance data available yet. Start recording sales to see this chart.")
     except Exception as e:
         st.error(f"Error generating regional performance chart: {str(e)}")
-    
+
+@st.fragment
+def render_recent_activity():
+    """Render the most recent sales"""
     # Recent activity
     st.markdown("<h2 class='sub-header'>Recent Activity</h2>", unsafe_allow_html=True)
     
     try:
         # Get recent sales transactions
-        cursor.execute("""
-        SELECT st.sale_id, d.dealer_name, p.product_name, s.scheme_name, 
-               st.quantity_sold, st.earned_dealer_incentive_amount, st.sale_timestamp
-        FROM sales_transactions st
-        JOIN dealers d ON st.dealer_id = d.dealer_id
-        JOIN products p ON st.product_id = p.product_id
-        JOIN schemes s ON st.scheme_id = s.scheme_id
-        ORDER BY st.sale_timestamp DESC
-        LIMIT 10
-        """)
-        
-        recent_sales = cursor.fetchall()
+        sales_df = get_recent_sales()
         
-        if recent_sales and len(recent_sales) > 0:
-            # Convert to DataFrame
-            sales_df = pd.DataFrame(recent_sales, columns=[
-                'Sale ID', 'Dealer', 'Product', 'Scheme', 
-                'Quantity', 'Incentive Amount', 'Timestamp'
-            ])
-            
-            # Format timestamp
-            sales_df['Timestamp'] = pd.to_datetime(sales_df['Timestamp']).dt.strftime('%Y-%m-%d %H:%M')
-            
+        if not sales_df.empty:
             # Display as table
             st.markdown("<div class='table-container'>", unsafe_allow_html=True)
-            st.table(sales_df)
+            st.dataframe(
+                sales_df,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'Incentive Amount': st.column_config.NumberColumn(format="₹%.2f")
+                }
+            )
             st.markdown("</div>", unsafe_allow_html=True)
         else:
             st.info("No recent sales activity available yet.")
     except Exception as e:
         st.error(f"Error retrieving recent activity: {str(e)}")
+
+def render_dashboard():
+    """Render the main dashboard"""
+    st.markdown("<h1 class='main-header'>Dealer Nudging System Dashboard</h1>", unsafe_allow_html=True)
     
-    conn.close()
+    # Each section is a fragment so it reruns on its own
+    render_dashboard_metrics()
+    render_scheme_effectiveness()
+    render_product_heatmap()
+    render_regional_performance()
+    render_recent_activity()
 
 # Scheme Explorer
 def render_schemes():
     """Render the scheme explorer page"""
     st.markdown("<h1 class='main-header'>Scheme Explorer</h1>", unsafe_allow_html=True)
     
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
-    
     # Filters
     st.markdown("<h2 class='sub-header'>Filters</h2>", unsafe_allow_html=True)
     
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        # Get scheme types
-        cursor.execute("SELECT DISTINCT scheme_type FROM schemes WHERE scheme_type IS NOT NULL")
-        scheme_types = [row[0] for row in cursor.fetchall()]
-        scheme_types = ['All'] + scheme_types
+    with st.form("scheme_filters"):
+        col1, col2, col3 = st.columns(3)
         
-        selected_type = st.selectbox("Scheme Type", scheme_types, key="scheme_type_filter")
-    
-    with col2:
-        # Get regions
-        cursor.execute("SELECT DISTINCT applicable_region FROM schemes WHERE applicable_region IS NOT NULL")
-        regions = [row[0] for row in cursor.fetchall()]
-        regions = ['All'] + regions
+        with col1:
+            # Get scheme types
+            scheme_types = get_distinct_values('schemes', 'scheme_type')
+            scheme_types = ['All'] + scheme_types
+            
+            selected_type = st.selectbox("Scheme Type", scheme_types, key="scheme_type_filter")
         
-        selected_region = st.selectbox("Region", regions, key="scheme_region_filter")
-    
-    with col3:
-        # Status filter
-        status_options = ['All', 'Active', 'Inactive']
-        selected_status = st.selectbox("Status", status_options, key="scheme_status_filter")
-    
-    # Build query based on filters
-    query = "SELECT * FROM schemes WHERE 1=1"
-    params = []
-    
-    if selected_type != 'All':
-        query += " AND scheme_type = ?"
-        params.append(selected_type)
-    
-    if selected_region != 'All':
-        query += " AND applicable_region = ?"
-        params.append(selected_region)
-    
-    if selected_status != 'All':
-        query += " AND deal_status = ?"
-        params.append(selected_status)
-    
-    query += " ORDER BY upload_timestamp DESC"
+        with col2:
+            # Get regions
+            regions = get_distinct_values('schemes', 'applicable_region')
+            regions = ['All'] + regions
+            
+            selected_region = st.selectbox("Region", regions, key="scheme_region_filter")
+        
+        with col3:
+            # Status filter
+            status_options = ['All', 'Active', 'Inactive']
+            selected_status = st.selectbox("Status", status_options, key="scheme_status_filter")
+        
+        st.form_submit_button("Apply")
     
-    # Execute query
-    cursor.execute(query, params)
-    schemes = cursor.fetchall()
+    # Filter the cached schemes
+    schemes = [
+        scheme for scheme in get_all_schemes()
+        if (selected_type == 'All' or scheme['scheme_type'] == selected_type)
+        and (selected_region == 'All' or scheme['applicable_region'] == selected_region)
+        and (selected_status == 'All' or scheme['deal_status'] == selected_status)
+    ]
     
     # Display schemes
     st.markdown("<h2 class='sub-header'>Schemes</h2>", unsafe_allow_html=True)
     
     if schemes and len(schemes) > 0:
-        for scheme in schemes:
-            # Determine card class based on approval status
-            card_class = "scheme-card"
-            if scheme['approval_status'] == 'Pending':
-                card_class += " approval-pending"
-            elif scheme['approval_status'] == 'Approved':
-                card_class += " approval-approved"
-            elif scheme['approval_status'] == 'Rejected':
-                card_class += " approval-rejected"
-            
-            st.markdown(f"<div class='{card_class}'>", unsafe_allow_html=True)
-            
-            # Scheme header
-            col1, col2, col3 = st.columns([3, 1, 1])
-            
-            with col1:
-                st.markdown(f"### {scheme['scheme_name']}")
-            
-            with col2:
-                st.markdown(f"**Type:** {scheme['scheme_type'] or 'N/A'}")
-            
-            with col3:
-                st.markdown(f"**Status:** {scheme['deal_status']}")
-            
-            # Scheme details
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown(f"**Period:** {scheme['scheme_period_start']} to {scheme['scheme_period_end']}")
-                st.markdown(f"**Region:** {scheme['applicable_region'] or 'All Regions'}")
-            
-            with col2:
-                st.markdown(f"**Dealer Eligibility:** {scheme['dealer_type_eligibility'] or 'All Dealers'}")
-                st.markdown(f"**Approval Status:** {scheme['approval_status']}")
+        # Card class for each approval status
+        card_classes = {
+            'Pending': "scheme-card approval-pending",
+            'Approved': "scheme-card approval-approved",
+            'Rejected': "scheme-card approval-rejected"
+        }
+        
+        # Get the products of every listed scheme at once, grouped by scheme
+        scheme_ids = [scheme['scheme_id'] for scheme in schemes]
+        placeholders = ','.join('?' for _ in scheme_ids)
+        
+        products_by_scheme = {}
+        with get_db_pool().borrow() as conn:
+            cursor = conn.cursor()
             
-            # Get products for this scheme
-            cursor.execute("""
-            SELECT p.product_name, sp.support_type, sp.payout_type, sp.payout_amount, sp.payout_unit, sp.free_item_description
+            cursor.execute(f"""
+            SELECT sp.scheme_id, p.product_name, sp.support_type, sp.payout_type, sp.payout_amount, sp.payout_unit, sp.free_item_description
             FROM scheme_products sp
             JOIN products p ON sp.product_id = p.product_id
-            WHERE sp.scheme_id = ?
-            """, (scheme['scheme_id'],))
+            WHERE sp.scheme_id IN ({placeholders})
+            ORDER BY sp.scheme_id, sp.id
+            """, scheme_ids)
             
-            products = cursor.fetchall()
+            for row in cursor:
+                products_by_scheme.setdefault(row['scheme_id'], []).append(row)
+        
+        for scheme in schemes:
+            card_class = card_classes.get(scheme['approval_status'], "scheme-card")
             
-            if products and len(products) > 0:
-                st.markdown("**Products:**")
+            product_items = []
+            for product in products_by_scheme.get(scheme['scheme_id'], []):
+                product_text = f"{html.escape(product['product_name'])}: {html.escape(product['support_type'] or 'Support')} - "
                 
-                for product in products:
-                    product_text = f"- {product['product_name']}: {product['support_type'] or 'Support'} - "
-                    
-                    if product['payout_type'] == 'Fixed':
-                        product_text += f"₹{product['payout_amount']} {product['payout_unit'] or ''}"
-                    elif product['payout_type'] == 'Percentage':
-                        product_text += f"{product['payout_amount']}% {product['payout_unit'] or ''}"
-                    else:
-                        product_text += f"{product['payout_amount']} {product['payout_unit'] or ''}"
-                    
-                    # Add free item if available
-                    if product['free_item_description']:
-                        product_text += f" + <span class='highlight'>Free: {product['free_item_description']}</span>"
-                    
-                    st.markdown(product_text, unsafe_allow_html=True)
+                if product['payout_type'] == 'Fixed':
+                    product_text += f"₹{product['payout_amount']} {html.escape(product['payout_unit'] or '')}"
+                elif product['payout_type'] == 'Percentage':
+                    product_text += f"{product['payout_amount']}% {html.escape(product['payout_unit'] or '')}"
+                else:
+                    product_text += f"{product['payout_amount']} {html.escape(product['payout_unit'] or '')}"
+                
+                # Add free item if available
+                if product['free_item_description']:
+                    product_text += f" + <span class='highlight'>Free: {html.escape(product['free_item_description'])}</span>"
+                
+                product_items.append(f"<li>{product_text}</li>")
+            
+            # Scheme header, details and products as a single card
+            card_html = [
+                f"<div class='{card_class}'>",
+                "<div class='scheme-card-header'>",
+                f"<h3>{html.escape(scheme['scheme_name'])}</h3>",
+                f"<span><b>Type:</b> {html.escape(scheme['scheme_type'] or 'N/A')}</span>",
+                f"<span><b>Status:</b> {html.escape(scheme['deal_status'] or '')}</span>",
+                "</div>",
+                "<div class='scheme-card-details'>",
+                f"<span><b>Period:</b> {scheme['scheme_period_start']} to {scheme['scheme_period_end']}</span>",
+                f"<span><b>Dealer Eligibility:</b> {html.escape(scheme['dealer_type_eligibility'] or 'All Dealers')}</span>",
+                f"<span><b>Region:</b> {html.escape(scheme['applicable_region'] or 'All Regions')}</span>",
+                f"<span><b>Approval Status:</b> {html.escape(scheme['approval_status'] or '')}</span>",
+                "</div>"
+            ]
+            
+            if product_items:
+                card_html.append(f"<b>Products:</b><ul>{''.join(product_items)}</ul>")
+            
+            card_html.append("</div>")
+            st.markdown("".join(card_html), unsafe_allow_html=True)
             
             # Actions
             col1, col2, col3 = st.columns([1, 1, 2])
@@ -578,21 +948,20 @@ def render_schemes():
                     st.session_state.edited_scheme = dict(scheme)
                     
                     # Get products for editing
-                    cursor.execute("""
-                    SELECT sp.*, p.product_name
-                    FROM scheme_products sp
-                    JOIN products p ON sp.product_id = p.product_id
-                    WHERE sp.scheme_id = ?
-                    """, (scheme['scheme_id'],))
-                    
-                    st.session_state.edited_products = [dict(p) for p in cursor.fetchall()]
+                    with get_db_pool().borrow() as conn:
+                        cursor = conn.cursor()
+                        
+                        cursor.execute("""
+                        SELECT sp.*, p.product_name
+                        FROM scheme_products sp
+                        JOIN products p ON sp.product_id = p.product_id
+                        WHERE sp.scheme_id = ?
+                        """, (scheme['scheme_id'],))
+                        
+                        st.session_state.edited_products = [dict(p) for p in cursor]
                     st.session_state.page = 'edit_scheme'
-            
-            st.markdown("</div>", unsafe_allow_html=True)
     else:
         st.info("No schemes found matching the selected filters.")
-    
-    conn.close()
 
 # Scheme Details
 def render_scheme_details():
@@ -603,21 +972,17 @@ def render_scheme_details():
             st.session_state.page = 'schemes'
         return
     
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
-    
     # Get scheme details
-    cursor.execute("SELECT * FROM schemes WHERE scheme_id = ?", (st.session_state.selected_scheme_id,))
-    scheme = cursor.fetchone()
+    details = get_scheme_details(st.session_state.selected_scheme_id)
     
-    if not scheme:
+    if not details:
         st.error("Scheme not found. It may have been deleted.")
         if st.button("Back to Scheme Explorer"):
             st.session_state.page = 'schemes'
-        conn.close()
         return
     
+    scheme = details['scheme']
+    
     # Display scheme header
     st.markdown(f"<h1 class='main-header'>{scheme['scheme_name']}</h1>", unsafe_allow_html=True)
     
@@ -647,14 +1012,7 @@ def render_scheme_details():
         st.markdown("</div>", unsafe_allow_html=True)
     
     # Get products for this scheme
-    cursor.execute("""
-    SELECT sp.*, p.product_name, p.product_category, p.ram, p.storage, p.color
-    FROM scheme_products sp
-    JOIN products p ON sp.product_id = p.product_id
-    WHERE sp.scheme_id = ?
-    """, (scheme['scheme_id'],))
-    
-    products = cursor.fetchall()
+    products = details['products']
     
     # Display products
     st.markdown("<h2 class='sub-header'>Products</h2>", unsafe_allow_html=True)
@@ -706,74 +1064,37 @@ def render_scheme_details():
         st.info("No products associated with this scheme.")
     
     # Get scheme rules
-    cursor.execute("SELECT * FROM scheme_rules WHERE scheme_id = ?", (scheme['scheme_id'],))
-    rules = cursor.fetchall()
+    rules = details['rules']
     
-    # Display rules
+    # Display rules, collapsed below the products
     if rules and len(rules) > 0:
-        st.markdown("<h2 class='sub-header'>Scheme Rules</h2>", unsafe_allow_html=True)
-        
-        for rule in rules:
-            st.markdown("<div class='card'>", unsafe_allow_html=True)
-            st.markdown(f"**Rule Type:** {rule['rule_type']}")
-            st.markdown(f"**Description:** {rule['rule_description']}")
-            st.markdown(f"**Value:** {rule['rule_value']}")
-            st.markdown("</div>", unsafe_allow_html=True)
+        with st.expander(f"Scheme Rules ({len(rules)})", expanded=False):
+            for rule in rules:
+                st.markdown(f"**Rule Type:** {rule['rule_type']}  \n"
+                            f"**Description:** {rule['rule_description']}  \n"
+                            f"**Value:** {rule['rule_value']}")
     
     # Get scheme parameters
-    cursor.execute("SELECT * FROM scheme_parameters WHERE scheme_id = ?", (scheme['scheme_id'],))
-    parameters = cursor.fetchall()
+    parameters = details['parameters']
     
-    # Display parameters
+    # Display parameters, collapsed below the products
     if parameters and len(parameters) > 0:
-        st.markdown("<h2 class='sub-header'>Scheme Parameters</h2>", unsafe_allow_html=True)
-        
-        for param in parameters:
-            st.markdown("<div class='card'>", unsafe_allow_html=True)
-            st.markdown(f"**Parameter:** {param['parameter_name']}")
-            st.markdown(f"**Description:** {param['parameter_description']}")
-            st.markdown(f"**Criteria:** {param['parameter_criteria']}")
-            st.markdown("</div>", unsafe_allow_html=True)
+        with st.expander(f"Scheme Parameters ({len(parameters)})", expanded=False):
+            for param in parameters:
+                st.markdown(f"**Parameter:** {param['parameter_name']}  \n"
+                            f"**Description:** {param['parameter_description']}  \n"
+                            f"**Criteria:** {param['parameter_criteria']}")
     
     # Get sales performance for this scheme
-    cursor.execute("""
-    SELECT p.product_name, COUNT(st.sale_id) as sales_count, SUM(st.earned_dealer_incentive_amount) as total_incentive
-    FROM sales_transactions st
-    JOIN products p ON st.product_id = p.product_id
-    WHERE st.scheme_id = ?
-    GROUP BY p.product_id
-    ORDER BY total_incentive DESC
-    """, (scheme['scheme_id'],))
-    
-    performance = cursor.fetchall()
+    perf_df = details['performance']
     
     # Display performance
-    if performance and len(performance) > 0:
+    if not perf_df.empty:
         st.markdown("<h2 class='sub-header'>Performance</h2>", unsafe_allow_html=True)
         
-        # Convert to DataFrame
-        perf_df = pd.DataFrame(performance, columns=['Product', 'Sales Count', 'Total Incentive'])
-        
-        # Create bar chart
-        fig = px.bar(
-            perf_df,
-            x='Product',
-            y='Total Incentive',
-            color='Sales Count',
-            labels={'Total Incentive': 'Total Incentive Amount (₹)', 'Product': 'Product Name'},
-            title='Product Performance in this Scheme',
-            color_continuous_scale=px.colors.sequential.Blues
-        )
-        
-        fig.update_layout(
-            xaxis_tickangle=-45,
-            height=500,
-            margin=dict(l=20, r=20, t=40, b=100)
-        )
+        fig = build_scheme_product_performance_fig(perf_df)
         
         st.plotly_chart(fig, use_container_width=True, key="scheme_product_performance")
-    
-    conn.close()
 
 # Edit Scheme
 def render_edit_scheme():
@@ -797,10 +1118,6 @@ def render_edit_scheme():
         st.session_state.page = 'schemes'
         return
     
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
-    
     # Edit form
     st.markdown("<div class='edit-mode'>", unsafe_allow_html=True)
     st.markdown("<h2 class='sub-header'>Scheme Details</h2>", unsafe_allow_html=True)
@@ -822,167 +1139,166 @@ def render_edit_scheme():
     # Edit products
     st.markdown("<h2 class='sub-header'>Products</h2>", unsafe_allow_html=True)
     
+    edited_df = None
+    
     if st.session_state.edited_products and len(st.session_state.edited_products) > 0:
-        for i, product in enumerate(st.session_state.edited_products):
-            st.markdown(f"<h3>Product: {product['product_name']}</h3>", unsafe_allow_html=True)
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                product['support_type'] = st.text_input("Support Type", product['support_type'] or "", key=f"support_type_{i}")
-                product['payout_type'] = st.selectbox("Payout Type", ['Fixed', 'Percentage', 'Other'], index=0 if product['payout_type'] == 'Fixed' else (1 if product['payout_type'] == 'Percentage' else 2), key=f"payout_type_{i}")
-                product['payout_amount'] = st.number_input("Payout Amount", min_value=0.0, value=float(product['payout_amount'] or 0), key=f"payout_amount_{i}")
-                product['payout_unit'] = st.text_input("Payout Unit", product['payout_unit'] or "", key=f"payout_unit_{i}")
-            
-            with col2:
-                product['dealer_contribution'] = st.number_input("Dealer Contribution", min_value=0.0, value=float(product['dealer_contribution'] or 0), key=f"dealer_contribution_{i}")
-                product['total_payout'] = st.number_input("Total Payout", min_value=0.0, value=float(product['total_payout'] or 0), key=f"total_payout_{i}")
-                product['is_bundle_offer'] = 1 if st.checkbox("Bundle Offer", product['is_bundle_offer'] == 1, key=f"is_bundle_{i}") else 0
-                
-                if product['is_bundle_offer'] == 1:
-                    product['bundle_price'] = st.number_input("Bundle Price", min_value=0.0, value=float(product['bundle_price'] or 0), key=f"bundle_price_{i}")
-            
-            # Free item section
-            product['free_item_description'] = st.text_input("Free Item Description (if any)", product['free_item_description'] or "", key=f"free_item_{i}")
-            
-            st.markdown("---")
+        # Edit all products in one grid, keyed by their scheme_products id
+        product_columns = [
+            'product_name', 'support_type', 'payout_type', 'payout_amount', 'payout_unit',
+            'dealer_contribution', 'total_payout', 'is_bundle_offer', 'bundle_price', 'free_item_description'
+        ]
+        stored_df = pd.DataFrame(st.session_state.edited_products).set_index('id')[product_columns]
+        products_df = stored_df.copy()
+        products_df['is_bundle_offer'] = products_df['is_bundle_offer'] == 1
+        amount_columns = ['payout_amount', 'dealer_contribution', 'total_payout', 'bundle_price']
+        # Amounts stored as text (e.g. with units) show as blank cells instead of breaking the grid
+        products_df[amount_columns] = products_df[amount_columns].apply(pd.to_numeric, errors='coerce')
+        
+        edited_df = st.data_editor(
+            products_df,
+            key=f"product_editor_{scheme['scheme_id']}",
+            hide_index=True,
+            use_container_width=True,
+            disabled=['product_name'],
+            column_config={
+                'product_name': st.column_config.TextColumn("Product"),
+                'support_type': st.column_config.TextColumn("Support Type"),
+                'payout_type': st.column_config.SelectboxColumn("Payout Type", options=['Fixed', 'Percentage', 'Other']),
+                'payout_amount': st.column_config.NumberColumn("Payout Amount", min_value=0.0),
+                'payout_unit': st.column_config.TextColumn("Payout Unit"),
+                'dealer_contribution': st.column_config.NumberColumn("Dealer Contribution", min_value=0.0),
+                'total_payout': st.column_config.NumberColumn("Total Payout", min_value=0.0),
+                'is_bundle_offer': st.column_config.CheckboxColumn("Bundle Offer"),
+                'bundle_price': st.column_config.NumberColumn("Bundle Price", min_value=0.0),
+                'free_item_description': st.column_config.TextColumn("Free Item Description")
+            }
+        )
     else:
         st.info("No products associated with this scheme.")
     
     # Submit button
     if st.button("Submit for Approval"):
         # Update scheme in database
-        try:
-            # First, create an approval request
-            cursor.execute("""
-            INSERT INTO scheme_approvals (scheme_id, requested_by, approval_status, approval_notes)
-            VALUES (?, ?, ?, ?)
-            """, (scheme['scheme_id'], "Current User", "Pending", "Edit request"))
+        with get_db_pool().borrow() as conn:
+            cursor = conn.cursor()
             
-            # Update scheme with edited values
-            cursor.execute("""
-            UPDATE schemes
-            SET scheme_name = ?, scheme_type = ?, scheme_period_start = ?, scheme_period_end = ?,
-                applicable_region = ?, dealer_type_eligibility = ?, deal_status = ?, notes = ?,
-                approval_status = ?, last_modified = CURRENT_TIMESTAMP
-            WHERE scheme_id = ?
-            """, (
-                scheme['scheme_name'], scheme['scheme_type'], scheme['scheme_period_start'], scheme['scheme_period_end'],
-                scheme['applicable_region'], scheme['dealer_type_eligibility'], scheme['deal_status'], scheme['notes'],
-                "Pending", scheme['scheme_id']
-            ))
-            
-            # Update products
-            if st.session_state.edited_products:
-                for product in st.session_state.edited_products:
-                    cursor.execute("""
+            try:
+                # First, create an approval request
+                cursor.execute("""
+                INSERT INTO scheme_approvals (scheme_id, requested_by, approval_status, approval_notes)
+                VALUES (?, ?, ?, ?)
+                """, (scheme['scheme_id'], "Current User", "Pending", "Edit request"))
+                
+                # Update scheme with edited values
+                cursor.execute("""
+                UPDATE schemes
+                SET scheme_name = ?, scheme_type = ?, scheme_period_start = ?, scheme_period_end = ?,
+                    applicable_region = ?, dealer_type_eligibility = ?, deal_status = ?, notes = ?,
+                    approval_status = ?, last_modified = CURRENT_TIMESTAMP
+                WHERE scheme_id = ?
+                """, (
+                    scheme['scheme_name'], scheme['scheme_type'], scheme['scheme_period_start'], scheme['scheme_period_end'],
+                    scheme['applicable_region'], scheme['dealer_type_eligibility'], scheme['deal_status'], scheme['notes'],
+                    "Pending", scheme['scheme_id']
+                ))
+                
+                # Update only the products whose values were changed in the grid
+                if edited_df is not None:
+                    changed = ((edited_df != products_df) & ~(edited_df.isna() & products_df.isna())).any(axis=1)
+                    changed_df = edited_df[changed].astype(object)
+                    # Cells left blank keep their stored value, so unparsed amounts are not wiped
+                    still_blank = edited_df[changed].isna() & products_df[changed].isna()
+                    changed_df = changed_df.mask(still_blank, stored_df[changed].astype(object))
+                    changed_df = changed_df.where(changed_df.notna(), None)
+                    
+                    cursor.executemany("""
                     UPDATE scheme_products
                     SET support_type = ?, payout_type = ?, payout_amount = ?, payout_unit = ?,
                         dealer_contribution = ?, total_payout = ?, is_bundle_offer = ?, bundle_price = ?,
                         free_item_description = ?, last_modified = CURRENT_TIMESTAMP
                     WHERE id = ?
-                    """, (
-                        product['support_type'], product['payout_type'], product['payout_amount'], product['payout_unit'],
-                        product['dealer_contribution'], product['total_payout'], product['is_bundle_offer'], product['bundle_price'],
-                        product['free_item_description'], product['id']
-                    ))
-            
-            conn.commit()
-            st.success("Scheme updated successfully and submitted for approval.")
-            
-            # Reset edit mode
-            st.session_state.edit_mode = False
-            st.session_state.edited_scheme = None
-            st.session_state.edited_products = None
+                    """, [
+                        (
+                            product.support_type, product.payout_type, product.payout_amount, product.payout_unit,
+                            product.dealer_contribution, product.total_payout, int(product.is_bundle_offer), product.bundle_price,
+                            product.free_item_description, int(product.Index)
+                        )
+                        for product in changed_df.itertuples()
+                    ])
+                
+                conn.commit()
+                clear_cached_queries()
+                st.success("Scheme updated successfully and submitted for approval.")
+                
+                # Reset edit mode
+                st.session_state.edit_mode = False
+                st.session_state.edited_scheme = None
+                st.session_state.edited_products = None
+                
+                # Redirect to schemes page
+                st.session_state.page = 'schemes'
+                st.rerun()
             
-            # Redirect to schemes page
-            st.session_state.page = 'schemes'
-            st.rerun()
-        
-        except Exception as e:
-            conn.rollback()
-            st.error(f"Error updating scheme: {str(e)}")
+            except Exception as e:
+                conn.rollback()
+                st.error(f"Error updating scheme: {str(e)}")
     
     st.markdown("</div>", unsafe_allow_html=True)
-    
-    conn.close()
 
 # Products
-def render_products():
-    """Render the products page"""
-    st.markdown("<h1 class='main-header'>Products</h1>", unsafe_allow_html=True)
-    
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
+@st.fragment
+def render_product_table():
+    """Render the product filters and the filtered listing, rerunning only when filters are applied"""
+    # Cached product listing
+    product_df = get_product_listing()
     
     # Filters
     st.markdown("<h2 class='sub-header'>Filters</h2>", unsafe_allow_html=True)
     
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        # Get product categories
-        cursor.execute("SELECT DISTINCT product_category FROM products WHERE product_category IS NOT NULL")
-        categories = [row[0] for row in cursor.fetchall()]
-        categories = ['All'] + categories
+    with st.form("product_filters"):
+        col1, col2, col3 = st.columns(3)
         
-        selected_category = st.selectbox("Category", categories, key="product_category_filter")
-    
-    with col2:
-        # Get RAM options
-        cursor.execute("SELECT DISTINCT ram FROM products WHERE ram IS NOT NULL")
-        ram_options = [row[0] for row in cursor.fetchall()]
-        ram_options = ['All'] + ram_options
+        with col1:
+            # Get product categories
+            categories = product_df['product_category'].cat.categories.tolist()
+            categories = ['All'] + categories
+            
+            selected_category = st.selectbox("Category", categories, key="product_category_filter")
         
-        selected_ram = st.selectbox("RAM", ram_options, key="product_ram_filter")
-    
-    with col3:
-        # Get storage options
-        cursor.execute("SELECT DISTINCT storage FROM products WHERE storage IS NOT NULL")
-        storage_options = [row[0] for row in cursor.fetchall()]
-        storage_options = ['All'] + storage_options
+        with col2:
+            # Get RAM options
+            ram_options = product_df['ram'].cat.categories.tolist()
+            ram_options = ['All'] + ram_options
+            
+            selected_ram = st.selectbox("RAM", ram_options, key="product_ram_filter")
+        
+        with col3:
+            # Get storage options
+            storage_options = product_df['storage'].cat.categories.tolist()
+            storage_options = ['All'] + storage_options
+            
+            selected_storage = st.selectbox("Storage", storage_options, key="product_storage_filter")
         
-        selected_storage = st.selectbox("Storage", storage_options, key="product_storage_filter")
+        st.form_submit_button("Apply")
     
-    # Build query based on filters
-    query = "SELECT * FROM products WHERE is_active = 1"
-    params = []
+    # Filter the product listing with one combined mask
+    mask = np.ones(len(product_df), dtype=bool)
     
     if selected_category != 'All':
-        query += " AND product_category = ?"
-        params.append(selected_category)
+        mask &= (product_df['product_category'] == selected_category).to_numpy()
     
     if selected_ram != 'All':
-        query += " AND ram = ?"
-        params.append(selected_ram)
+        mask &= (product_df['ram'] == selected_ram).to_numpy()
     
     if selected_storage != 'All':
-        query += " AND storage = ?"
-        params.append(selected_storage)
+        mask &= (product_df['storage'] == selected_storage).to_numpy()
     
-    query += " ORDER BY product_name"
-    
-    # Execute query
-    cursor.execute(query, params)
-    products = cursor.fetchall()
+    product_df = product_df[mask]
     
     # Display products
     st.markdown("<h2 class='sub-header'>Products</h2>", unsafe_allow_html=True)
     
-    if products and len(products) > 0:
-        # Convert to DataFrame
-        product_df = pd.DataFrame([dict(p) for p in products])
-        
-        # Select columns to display
-        display_columns = [
-            'product_name', 'product_code', 'product_category', 'product_subcategory',
-            'ram', 'storage', 'connectivity', 'color', 'dealer_price_dp', 'mrp'
-        ]
-        
-        # Filter columns that exist in the DataFrame
-        display_columns = [col for col in display_columns if col in product_df.columns]
-        
+    if not product_df.empty:
         # Rename columns for display
         rename_map = {
             'product_name': 'Product Name',
@@ -997,139 +1313,93 @@ def render_products():
             'mrp': 'MRP'
         }
         
-        # Create display DataFrame
-        display_df = product_df[display_columns].rename(columns=rename_map)
-        
-        # Display as table
-        st.markdown("<div class='table-container'>", unsafe_allow_html=True)
-        st.dataframe(display_df, use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Product performance visualization
-        st.markdown("<h2 class='sub-header'>Product Performance</h2>", unsafe_allow_html=True)
-        
-        try:
-            # Get product sales data
-            cursor.execute("""
-            SELECT p.product_name, COUNT(st.sale_id) as sales_count, SUM(st.earned_dealer_incentive_amount) as total_incentive
-            FROM products p
-            LEFT JOIN sales_transactions st ON p.product_id = st.product_id
-            WHERE p.is_active = 1
-            GROUP BY p.product_id
-            ORDER BY total_incentive DESC
-            LIMIT 15
-            """)
-            
-            product_performance = cursor.fetchall()
-            
-            if product_performance and len(product_performance) > 0:
-                # Convert to DataFrame
-                perf_df = pd.DataFrame(product_performance, columns=['Product', 'Sales Count', 'Total Incentive'])
-                perf_df = perf_df.fillna(0)  # Replace NaN with 0
-                
-                # Create bar chart
-                fig = px.bar(
-                    perf_df,
-                    x='Product',
-                    y='Total Incentive',
-                    color='Sales Count',
-                    labels={'Total Incentive': 'Total Incentive Amount (₹)', 'Product': 'Product Name'},
-                    title='Top Performing Products by Incentive Amount',
-                    color_continuous_scale=px.colors.sequential.Blues
-                )
-                
-                fig.update_layout(
-                    xaxis_tickangle=-45,
-                    height=500,
-                    margin=dict(l=20, r=20, t=40, b=100)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True, key="product_performance_chart")
-            else:
-                st.info("No product performance data available yet.")
-        except Exception as e:
-            st.error(f"Error generating product performance chart: {str(e)}")
+        # Create display DataFrame
+        display_df = product_df.reset_index(drop=True).rename(columns=rename_map)
+        
+        # Display as table
+        st.markdown("<div class='table-container'>", unsafe_allow_html=True)
+        st.dataframe(display_df, use_container_width=True)
+        st.markdown("</div>", unsafe_allow_html=True)
     else:
         st.info("No products found matching the selected filters.")
+
+def render_products():
+    """Render the products page"""
+    st.markdown("<h1 class='main-header'>Products</h1>", unsafe_allow_html=True)
+    
+    # Filters and listing
+    render_product_table()
+    
+    # Product performance visualization
+    st.markdown("<h2 class='sub-header'>Product Performance</h2>", unsafe_allow_html=True)
     
-    conn.close()
+    try:
+        # Get product sales data
+        perf_df = get_product_performance()
+        
+        if not perf_df.empty:
+            fig = build_product_performance_fig(perf_df)
+            
+            st.plotly_chart(fig, use_container_width=True, key="product_performance_chart")
+        else:
+            st.info("No product performance data available yet.")
+    except Exception as e:
+        st.error(f"Error generating product performance chart: {str(e)}")
 
 # Dealers
-def render_dealers():
-    """Render the dealers page"""
-    st.markdown("<h1 class='main-header'>Dealers</h1>", unsafe_allow_html=True)
-    
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
+@st.fragment
+def render_dealer_table():
+    """Render the dealer filters and the filtered listing, rerunning only when filters are applied"""
+    # Cached dealer listing
+    dealer_df = get_dealer_listing()
     
     # Filters
     st.markdown("<h2 class='sub-header'>Filters</h2>", unsafe_allow_html=True)
     
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        # Get dealer types
-        cursor.execute("SELECT DISTINCT dealer_type FROM dealers WHERE dealer_type IS NOT NULL")
-        dealer_types = [row[0] for row in cursor.fetchall()]
-        dealer_types = ['All'] + dealer_types
+    with st.form("dealer_filters"):
+        col1, col2, col3 = st.columns(3)
         
-        selected_type = st.selectbox("Dealer Type", dealer_types, key="dealer_type_filter")
-    
-    with col2:
-        # Get regions
-        cursor.execute("SELECT DISTINCT region FROM dealers WHERE region IS NOT NULL")
-        regions = [row[0] for row in cursor.fetchall()]
-        regions = ['All'] + regions
+        with col1:
+            # Get dealer types
+            dealer_types = dealer_df['dealer_type'].cat.categories.tolist()
+            dealer_types = ['All'] + dealer_types
+            
+            selected_type = st.selectbox("Dealer Type", dealer_types, key="dealer_type_filter")
         
-        selected_region = st.selectbox("Region", regions, key="dealer_region_filter")
-    
-    with col3:
-        # Get states
-        cursor.execute("SELECT DISTINCT state FROM dealers WHERE state IS NOT NULL")
-        states = [row[0] for row in cursor.fetchall()]
-        states = ['All'] + states
+        with col2:
+            # Get regions
+            regions = dealer_df['region'].cat.categories.tolist()
+            regions = ['All'] + regions
+            
+            selected_region = st.selectbox("Region", regions, key="dealer_region_filter")
+        
+        with col3:
+            # Get states
+            states = dealer_df['state'].cat.categories.tolist()
+            states = ['All'] + states
+            
+            selected_state = st.selectbox("State", states, key="dealer_state_filter")
         
-        selected_state = st.selectbox("State", states, key="dealer_state_filter")
+        st.form_submit_button("Apply")
     
-    # Build query based on filters
-    query = "SELECT * FROM dealers WHERE is_active = 1"
-    params = []
+    # Filter the dealer listing with one combined mask
+    mask = np.ones(len(dealer_df), dtype=bool)
     
     if selected_type != 'All':
-        query += " AND dealer_type = ?"
-        params.append(selected_type)
+        mask &= (dealer_df['dealer_type'] == selected_type).to_numpy()
     
     if selected_region != 'All':
-        query += " AND region = ?"
-        params.append(selected_region)
+        mask &= (dealer_df['region'] == selected_region).to_numpy()
     
     if selected_state != 'All':
-        query += " AND state = ?"
-        params.append(selected_state)
-    
-    query += " ORDER BY dealer_name"
+        mask &= (dealer_df['state'] == selected_state).to_numpy()
     
-    # Execute query
-    cursor.execute(query, params)
-    dealers = cursor.fetchall()
+    dealer_df = dealer_df[mask]
     
     # Display dealers
     st.markdown("<h2 class='sub-header'>Dealers</h2>", unsafe_allow_html=True)
     
-    if dealers and len(dealers) > 0:
-        # Convert to DataFrame
-        dealer_df = pd.DataFrame([dict(d) for d in dealers])
-        
-        # Select columns to display
-        display_columns = [
-            'dealer_name', 'dealer_code', 'dealer_type', 'region', 'state', 'city',
-            'contact_person', 'contact_email', 'contact_phone'
-        ]
-        
-        # Filter columns that exist in the DataFrame
-        display_columns = [col for col in display_columns if col in dealer_df.columns]
-        
+    if not dealer_df.empty:
         # Rename columns for display
         rename_map = {
             'dealer_name': 'Dealer Name',
@@ -1144,90 +1414,42 @@ def render_dealers():
         }
         
         # Create display DataFrame
-        display_df = dealer_df[display_columns].rename(columns=rename_map)
+        display_df = dealer_df.reset_index(drop=True).rename(columns=rename_map)
         
         # Display as table
         st.markdown("<div class='table-container'>", unsafe_allow_html=True)
         st.dataframe(display_df, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Dealer performance visualization
-        st.markdown("<h2 class='sub-header'>Dealer Performance</h2>", unsafe_allow_html=True)
-        
-        try:
-            # Get dealer sales data
-            cursor.execute("""
-            SELECT d.dealer_name, COUNT(st.sale_id) as sales_count, SUM(st.earned_dealer_incentive_amount) as total_incentive
-            FROM dealers d
-            LEFT JOIN sales_transactions st ON d.dealer_id = st.dealer_id
-            WHERE d.is_active = 1
-            GROUP BY d.dealer_id
-            ORDER BY total_incentive DESC
-            LIMIT 15
-            """)
-            
-            dealer_performance = cursor.fetchall()
-            
-            if dealer_performance and len(dealer_performance) > 0:
-                # Convert to DataFrame
-                perf_df = pd.DataFrame(dealer_performance, columns=['Dealer', 'Sales Count', 'Total Incentive'])
-                perf_df = perf_df.fillna(0)  # Replace NaN with 0
-                
-                # Create bar chart
-                fig = px.bar(
-                    perf_df,
-                    x='Dealer',
-                    y='Total Incentive',
-                    color='Sales Count',
-                    labels={'Total Incentive': 'Total Incentive Amount (₹)', 'Dealer': 'Dealer Name'},
-                    title='Top Performing Dealers by Incentive Amount',
-                    color_continuous_scale=px.colors.sequential.Blues
-                )
-                
-                fig.update_layout(
-                    xaxis_tickangle=-45,
-                    height=500,
-                    margin=dict(l=20, r=20, t=40, b=100)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True, key="dealer_performance_chart")
-            else:
-                st.info("No dealer performance data available yet.")
-        except Exception as e:
-            st.error(f"Error generating dealer performance chart: {str(e)}")
     else:
         st.info("No dealers found matching the selected filters.")
-    
-    conn.close()
 
-# Sales Simulation
-def render_simulate_sales():
-    """Render the sales simulation page"""
-    st.markdown("<h1 class='main-header'>Sales Simulation</h1>", unsafe_allow_html=True)
-    
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
-    
-    # Get active schemes
-    cursor.execute("SELECT scheme_id, scheme_name FROM schemes WHERE deal_status = 'Active' LIMIT 10")
-    schemes = cursor.fetchall()
-    
-    if not schemes or len(schemes) == 0:
-        st.error("No active schemes found. Please add schemes first.")
-        conn.close()
-        return
+def render_dealers():
+    """Render the dealers page"""
+    st.markdown("<h1 class='main-header'>Dealers</h1>", unsafe_allow_html=True)
     
-    # Get active dealers
-    cursor.execute("SELECT dealer_id, dealer_name FROM dealers WHERE is_active = 1")
-    dealers = cursor.fetchall()
+    # Filters and listing
+    render_dealer_table()
     
-    if not dealers or len(dealers) == 0:
-        st.error("No active dealers found. Please add dealers first.")
-        conn.close()
-        return
+    # Dealer performance visualization
+    st.markdown("<h2 class='sub-header'>Dealer Performance</h2>", unsafe_allow_html=True)
     
-    # Simulation form
+    try:
+        # Get dealer sales data
+        perf_df = get_dealer_performance()
+        
+        if not perf_df.empty:
+            fig = build_dealer_performance_fig(perf_df)
+            
+            st.plotly_chart(fig, use_container_width=True, key="dealer_performance_chart")
+        else:
+            st.info("No dealer performance data available yet.")
+    except Exception as e:
+        st.error(f"Error generating dealer performance chart: {str(e)}")
+
+# Simulation form
+@st.fragment
+def render_simulation_form(schemes, dealers):
+    """Render the simulation parameters and results, rerunning only on their own widget changes"""
     st.markdown("<h2 class='sub-header'>Simulation Parameters</h2>", unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
@@ -1238,18 +1460,10 @@ def render_simulate_sales():
         selected_scheme_id = st.selectbox("Select Scheme", list(scheme_options.keys()), format_func=lambda x: scheme_options[x], key="sim_scheme")
         
         # Get products for selected scheme
-        cursor.execute("""
-        SELECT p.product_id, p.product_name, p.dealer_price_dp, sp.payout_amount, sp.payout_type, sp.free_item_description
-        FROM products p
-        JOIN scheme_products sp ON p.product_id = sp.product_id
-        WHERE sp.scheme_id = ? AND p.is_active = 1
-        """, (selected_scheme_id,))
-        
-        products = cursor.fetchall()
+        products = get_scheme_products_for_sale(selected_scheme_id)
         
         if not products or len(products) == 0:
             st.error("No products found for the selected scheme.")
-            conn.close()
             return
         
         # Select product
@@ -1257,11 +1471,8 @@ def render_simulate_sales():
         selected_product_id = st.selectbox("Select Product", list(product_options.keys()), format_func=lambda x: product_options[x], key="sim_product")
         
         # Get selected product details
-        selected_product = None
-        for product in products:
-            if product['product_id'] == selected_product_id:
-                selected_product = product
-                break
+        products_by_id = {product['product_id']: product for product in products}
+        selected_product = products_by_id.get(selected_product_id)
         
         # Quantity
         quantity = st.number_input("Quantity", min_value=1, value=1, key="sim_quantity")
@@ -1281,26 +1492,13 @@ def render_simulate_sales():
     if st.button("Simulate Sale"):
         if selected_product is None:
             st.error("Error: Selected product not found.")
-            conn.close()
             return
         
         try:
-            # Calculate dealer price and incentive
-            # Use safe dictionary access with fallback values
-            try:
-                dealer_price = float(selected_product['dealer_price_dp']) if selected_product['dealer_price_dp'] is not None else 10000.0
-            except (TypeError, KeyError):
-                dealer_price = 10000.0  # Default value
-            
-            try:
-                payout_amount = float(selected_product['payout_amount']) if selected_product['payout_amount'] is not None else 0.0
-            except (TypeError, KeyError):
-                payout_amount = 0.0  # Default value
-            
-            try:
-                payout_type = selected_product['payout_type'] if selected_product['payout_type'] is not None else 'Fixed'
-            except (TypeError, KeyError):
-                payout_type = 'Fixed'  # Default value
+            # Calculate dealer price and incentive, with missing values defaulted in SQL
+            dealer_price = float(selected_product['dealer_price_dp'])
+            payout_amount = float(selected_product['payout_amount'])
+            payout_type = selected_product['payout_type']
             
             # Calculate incentive based on payout type
             if payout_type == 'Percentage':
@@ -1317,87 +1515,111 @@ def render_simulate_sales():
             col1, col2 = st.columns(2)
             
             with col1:
-                st.markdown("<div class='card'>", unsafe_allow_html=True)
-                st.markdown(f"**Dealer:** {dealer_options[selected_dealer_id]}")
-                st.markdown(f"**Scheme:** {scheme_options[selected_scheme_id]}")
-                st.markdown(f"**Product:** {product_options[selected_product_id]}")
-                st.markdown(f"**Quantity:** {quantity}")
-                st.markdown(f"**Sale Date:** {sale_date}")
-                st.markdown("</div>", unsafe_allow_html=True)
+                st.markdown(
+                    "<div class='card'>"
+                    f"<b>Dealer:</b> {html.escape(dealer_options[selected_dealer_id])}<br>"
+                    f"<b>Scheme:</b> {html.escape(scheme_options[selected_scheme_id])}<br>"
+                    f"<b>Product:</b> {html.escape(product_options[selected_product_id])}<br>"
+                    f"<b>Quantity:</b> {quantity}<br>"
+                    f"<b>Sale Date:</b> {sale_date}"
+                    "</div>",
+                    unsafe_allow_html=True
+                )
             
             with col2:
-                st.markdown("<div class='card'>", unsafe_allow_html=True)
-                st.markdown(f"**Dealer Price:** ₹{dealer_price:,.2f}")
-                st.markdown(f"**Total Dealer Price:** ₹{total_dealer_price:,.2f}")
-                st.markdown(f"**Incentive Type:** {payout_type}")
-                st.markdown(f"**Incentive Amount:** ₹{incentive_amount:,.2f}")
-                st.markdown("</div>", unsafe_allow_html=True)
+                st.markdown(
+                    "<div class='card'>"
+                    f"<b>Dealer Price:</b> ₹{dealer_price:,.2f}<br>"
+                    f"<b>Total Dealer Price:</b> ₹{total_dealer_price:,.2f}<br>"
+                    f"<b>Incentive Type:</b> {html.escape(payout_type)}<br>"
+                    f"<b>Incentive Amount:</b> ₹{incentive_amount:,.2f}"
+                    "</div>",
+                    unsafe_allow_html=True
+                )
             
             # Check for free items and display customer prompt
-            try:
-                free_item = selected_product['free_item_description'] if selected_product['free_item_description'] is not None else None
-            except (TypeError, KeyError):
-                free_item = None
+            free_item = selected_product['free_item_description']
             
             if free_item:
-                st.markdown("<div class='free-item-alert'>", unsafe_allow_html=True)
-                st.markdown("### 🎁 Free Item Included!")
-                st.markdown(f"**Free Item:** {free_item}")
-                
-                # Customer prompt section
-                st.markdown("### 📣 Suggested Customer Prompt")
-                st.markdown(f"""
-                *"I'd like to inform you that with your purchase of {product_options[selected_product_id]}, 
-                you'll receive a {free_item} absolutely free! This is part of our special 
-                {scheme_options[selected_scheme_id]} promotion running right now."*
-                """)
-                st.markdown("</div>", unsafe_allow_html=True)
+                # Free item alert with the suggested customer prompt
+                st.markdown(
+                    "<div class='free-item-alert'>"
+                    "<h3>🎁 Free Item Included!</h3>"
+                    f"<b>Free Item:</b> {html.escape(free_item)}"
+                    "<h3>📣 Suggested Customer Prompt</h3>"
+                    f"<em>\"I'd like to inform you that with your purchase of {html.escape(product_options[selected_product_id])}, "
+                    f"you'll receive a {html.escape(free_item)} absolutely free! This is part of our special "
+                    f"{html.escape(scheme_options[selected_scheme_id])} promotion running right now.\"</em>"
+                    "</div>",
+                    unsafe_allow_html=True
+                )
             
             # Record sale button
             if st.button("Record This Sale"):
-                try:
-                    # Insert into sales_transactions
-                    cursor.execute("""
-                    INSERT INTO sales_transactions (
-                        dealer_id, scheme_id, product_id, quantity_sold, dealer_price_dp,
-                        earned_dealer_incentive_amount, imei_serial, sale_timestamp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        selected_dealer_id, selected_scheme_id, selected_product_id, quantity,
-                        dealer_price, incentive_amount, imei_serial, sale_date.strftime("%Y-%m-%d %H:%M:%S")
-                    ))
+                with get_db_pool().borrow() as conn:
+                    cursor = conn.cursor()
                     
-                    conn.commit()
-                    st.success("Sale recorded successfully!")
-                except Exception as e:
-                    conn.rollback()
-                    st.error(f"Error recording sale: {str(e)}")
+                    try:
+                        # Insert into sales_transactions
+                        cursor.execute("""
+                        INSERT INTO sales_transactions (
+                            dealer_id, scheme_id, product_id, quantity_sold, dealer_price_dp,
+                            earned_dealer_incentive_amount, imei_serial, sale_timestamp
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """, (
+                            selected_dealer_id, selected_scheme_id, selected_product_id, quantity,
+                            dealer_price, incentive_amount, imei_serial, sale_date.strftime("%Y-%m-%d %H:%M:%S")
+                        ))
+                        
+                        conn.commit()
+                        clear_sales_queries()
+                        st.success("Sale recorded successfully!")
+                    except Exception as e:
+                        conn.rollback()
+                        st.error(f"Error recording sale: {str(e)}")
         
         except Exception as e:
             st.error(f"Error simulating sale: {str(e)}")
+
+# Sales Simulation
+def render_simulate_sales():
+    """Render the sales simulation page"""
+    st.markdown("<h1 class='main-header'>Sales Simulation</h1>", unsafe_allow_html=True)
+    
+    # Get active schemes
+    schemes = get_active_schemes()
+
+    if not schemes or len(schemes) == 0:
+        st.error("No active schemes found. Please add schemes first.")
+        return
+
+    # Get active dealers
+    dealers = get_active_dealers()
+    
+    if not dealers or len(dealers) == 0:
+        st.error("No active dealers found. Please add dealers first.")
+        return
+    
+    render_simulation_form(schemes, dealers)
     
     # Historical sales simulation
     st.markdown("<h2 class='sub-header'>Historical Sales Analysis</h2>", unsafe_allow_html=True)
     
     try:
         # Get historical sales data
-        cursor.execute("""
-        SELECT st.sale_id, d.dealer_name, p.product_name, s.scheme_name, 
-               st.quantity_sold, st.earned_dealer_incentive_amount, st.sale_timestamp
-        FROM sales_transactions st
-        JOIN dealers d ON st.dealer_id = d.dealer_id
-        JOIN products p ON st.product_id = p.product_id
-        JOIN schemes s ON st.scheme_id = s.scheme_id
-        ORDER BY st.sale_timestamp DESC
-        LIMIT 20
-        """)
-        
-        sales = cursor.fetchall()
-        
-        if sales and len(sales) > 0:
-            # Convert to DataFrame
-            sales_df = pd.DataFrame([dict(s) for s in sales])
-            
+        with get_db_pool().borrow() as conn:
+            sales_df = pd.read_sql_query("""
+            SELECT st.sale_id, d.dealer_name, p.product_name, s.scheme_name, 
+                   st.quantity_sold, st.earned_dealer_incentive_amount, st.sale_timestamp
+            FROM sales_transactions st
+            JOIN dealers d ON st.dealer_id = d.dealer_id
+            JOIN products p ON st.product_id = p.product_id
+            JOIN schemes s ON st.scheme_id = s.scheme_id
+            ORDER BY st.sale_timestamp DESC
+            LIMIT 20
+            """, conn, dtype_backend="pyarrow")
+        
+        if not sales_df.empty:
             # Select columns to display
             display_columns = [
                 'dealer_name', 'product_name', 'scheme_name', 'quantity_sold',
@@ -1428,41 +1650,33 @@ def render_simulate_sales():
             # Sales trend visualization
             st.markdown("<h3>Sales Trend</h3>", unsafe_allow_html=True)
             
-            # Convert timestamp to datetime
-            sales_df['sale_timestamp'] = pd.to_datetime(sales_df['sale_timestamp'])
-            
-            # Group by date
-            sales_df['date'] = sales_df['sale_timestamp'].dt.date
-            trend_df = sales_df.groupby('date').agg({
-                'earned_dealer_incentive_amount': 'sum',
-                'sale_id': 'count'
-            }).reset_index()
-            
+            # Aggregate the same recent sales by day in SQL
+            with get_db_pool().borrow() as conn:
+                trend_df = pd.read_sql_query("""
+                SELECT DATE(recent.sale_timestamp) AS sale_date,
+                       SUM(recent.earned_dealer_incentive_amount) AS incentive_amount,
+                       COUNT(recent.sale_id) AS sales_count
+                FROM (
+                    SELECT st.sale_id, st.earned_dealer_incentive_amount, st.sale_timestamp
+                    FROM sales_transactions st
+                    JOIN dealers d ON st.dealer_id = d.dealer_id
+                    JOIN products p ON st.product_id = p.product_id
+                    JOIN schemes s ON st.scheme_id = s.scheme_id
+                    ORDER BY st.sale_timestamp DESC
+                    LIMIT 20
+                ) recent
+                GROUP BY sale_date
+                ORDER BY sale_date
+                """, conn)
             trend_df.columns = ['Date', 'Incentive Amount', 'Sales Count']
             
-            # Create line chart
-            fig = px.line(
-                trend_df,
-                x='Date',
-                y=['Incentive Amount', 'Sales Count'],
-                labels={'value': 'Value', 'variable': 'Metric'},
-                title='Sales Trend Over Time',
-                color_discrete_sequence=['#1976D2', '#FFC107']
-            )
-            
-            fig.update_layout(
-                height=400,
-                margin=dict(l=20, r=20, t=40, b=20),
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-            )
+            fig = build_sales_trend_fig(trend_df)
             
             st.plotly_chart(fig, use_container_width=True, key="sales_trend_chart")
         else:
             st.info("No sales data available yet.")
     except Exception as e:
         st.error(f"Error retrieving sales data: {str(e)}")
-    
-    conn.close()
 
 
 # Cart Mode
@@ -1471,10 +1685,6 @@ def render_cart_mode():
     st.markdown("<h1 class='main-header'>Cart Mode</h1>", unsafe_allow_html=True)
     st.markdown("Simulate a shop billing experience. Add products to the cart and see applicable offers in real-time.")
     
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
-    
     # Layout with two columns
     col1, col2 = st.columns([3, 2])
     
@@ -1482,62 +1692,47 @@ def render_cart_mode():
         st.markdown("<h2 class='sub-header'>Product Selection</h2>", unsafe_allow_html=True)
         
         # Dealer selection
-        cursor.execute("SELECT dealer_id, dealer_name, dealer_type, region FROM dealers WHERE is_active = 1")
-        dealers = cursor.fetchall()
+        dealers = get_active_dealers()
         
-        dealer_options = {f"{dealer[1]} ({dealer[2]}, {dealer[3]})": dealer[0] for dealer in dealers}
+        dealer_options = {f"{dealer['dealer_name']} ({dealer['dealer_type']}, {dealer['region']})": dealer for dealer in dealers}
         selected_dealer_name = st.selectbox("Select Dealer", list(dealer_options.keys()), key="cart_dealer_select")
-        selected_dealer_id = dealer_options[selected_dealer_name]
+        selected_dealer = dealer_options[selected_dealer_name]
+        selected_dealer_id = selected_dealer['dealer_id']
         
-        # Get dealer details for offer matching
-        cursor.execute("SELECT dealer_type, region, state, city FROM dealers WHERE dealer_id = ?", (selected_dealer_id,))
-        dealer_details = cursor.fetchone()
-        dealer_type = dealer_details[0]
-        dealer_region = dealer_details[1]
-        dealer_state = dealer_details[2]
-        dealer_city = dealer_details[3]
+        # Dealer details for offer matching
+        dealer_type = selected_dealer['dealer_type']
+        dealer_region = selected_dealer['region']
+        dealer_state = selected_dealer['state']
+        dealer_city = selected_dealer['city']
         
         # Product category filter
-        cursor.execute("SELECT DISTINCT product_category FROM products WHERE is_active = 1")
-        categories = [row[0] for row in cursor.fetchall()]
+        categories = get_product_categories()
         selected_category = st.selectbox("Product Category", categories, key="cart_category_filter")
         
         # Product selection
-        cursor.execute("""
-        SELECT product_id, product_name, product_code, ram, storage, color, dealer_price_dp, mrp
-        FROM products
-        WHERE product_category = ? AND is_active = 1
-        ORDER BY product_name
-        """, (selected_category,))
-        
-        products = cursor.fetchall()
+        products = get_products_for_sale(selected_category)
         
         if products:
-            # Create a DataFrame for better display
-            product_df = pd.DataFrame(products, columns=[
-                'product_id', 'Product Name', 'Product Code', 'RAM', 'Storage', 'Color', 'Dealer Price', 'MRP'
-            ])
-            
             # Display products in a table with add button
             st.markdown("<div class='table-container'>", unsafe_allow_html=True)
-            for i, row in product_df.iterrows():
+            for product_id, product_name, product_code, ram, storage, color, dealer_price, mrp in products:
                 col_a, col_b, col_c = st.columns([3, 1, 1])
                 
                 with col_a:
-                    st.write(f"**{row['Product Name']}** ({row['Product Code']})")
-                    st.write(f"{row['RAM']} | {row['Storage']} | {row['Color']}")
+                    st.write(f"**{product_name}** ({product_code})")
+                    st.write(f"{ram} | {storage} | {color}")
                 
                 with col_b:
-                    st.write(f"₹{row['Dealer Price']:,.2f}")
-                    st.write(f"MRP: ₹{row['MRP']:,.2f}")
+                    st.write(f"₹{dealer_price:,.2f}")
+                    st.write(f"MRP: ₹{mrp:,.2f}")
                 
                 with col_c:
-                    quantity = st.number_input("Qty", min_value=1, max_value=10, value=1, step=1, key=f"qty_{row['product_id']}")
-                    if st.button("Add to Cart", key=f"add_{row['product_id']}"):
+                    quantity = st.number_input("Qty", min_value=1, max_value=10, value=1, step=1, key=f"qty_{product_id}")
+                    if st.button("Add to Cart", key=f"add_{product_id}"):
                         # Check if product already in cart
                         product_in_cart = False
                         for i, item in enumerate(st.session_state.cart_items):
-                            if item['product_id'] == row['product_id']:
+                            if item['product_id'] == product_id:
                                 # Update quantity
                                 st.session_state.cart_items[i]['quantity'] += quantity
                                 product_in_cart = True
@@ -1546,11 +1741,11 @@ def render_cart_mode():
                         if not product_in_cart:
                             # Add new item to cart
                             st.session_state.cart_items.append({
-                                'product_id': row['product_id'],
-                                'product_name': row['Product Name'],
-                                'product_code': row['Product Code'],
-                                'dealer_price': row['Dealer Price'],
-                                'mrp': row['MRP'],
+                                'product_id': product_id,
+                                'product_name': product_name,
+                                'product_code': product_code,
+                                'dealer_price': dealer_price,
+                                'mrp': mrp,
                                 'quantity': quantity
                             })
                         
@@ -1565,13 +1760,9 @@ def render_cart_mode():
                         
                         # Reset selected offer if not applicable anymore
                         if st.session_state.selected_offer:
-                            offer_still_valid = False
-                            for offer in st.session_state.available_offers:
-                                if offer['scheme_id'] == st.session_state.selected_offer['scheme_id']:
-                                    offer_still_valid = True
-                                    break
+                            available_scheme_ids = {offer['scheme_id'] for offer in st.session_state.available_offers}
                             
-                            if not offer_still_valid:
+                            if st.session_state.selected_offer['scheme_id'] not in available_scheme_ids:
                                 st.session_state.selected_offer = None
                         
                         st.rerun()
@@ -1709,56 +1900,60 @@ def render_cart_mode():
             with col_b:
                 if st.button("Checkout", key="checkout"):
                     # Record the transaction
-                    try:
-                        sale_ts = datetime.datetime.combine( 
-                            st.session_state.billing_date, 
-                            datetime.datetime.now().time()
-                            ).strftime('%Y-%m-%d %H:%M:%S')
-                        for item in st.session_state.cart_items:
-                            scheme_id = None
-                            earned_incentive = 0
-                            
-                            if st.session_state.selected_offer:
-                                scheme_id = st.session_state.selected_offer['scheme_id']
-                                # Calculate per-item incentive
-                                if item['product_id'] in st.session_state.selected_offer['applicable_products']:
-                                    if st.session_state.selected_offer['payout_type'] == 'Fixed':
-                                        earned_incentive = st.session_state.selected_offer['payout_amount'] * item['quantity']
-                                    elif st.session_state.selected_offer['payout_type'] == 'Percentage':
-                                        earned_incentive = (item['dealer_price'] * st.session_state.selected_offer['payout_amount'] / 100) * item['quantity']
-                            
-                            # Generate random IMEI
-                            import random
-                            imei = ''.join([str(random.randint(0, 9)) for _ in range(15)])
+                    with get_db_pool().borrow() as conn:
+                        cursor = conn.cursor()
+                        
+                        try:
+                            sale_ts = datetime.datetime.combine( 
+                                st.session_state.billing_date, 
+                                datetime.datetime.now().time()
+                                ).strftime('%Y-%m-%d %H:%M:%S')
+                            imeis = generate_imeis(len(st.session_state.cart_items))
+                            sale_rows = []
+                            for item, imei in zip(st.session_state.cart_items, imeis):
+                                scheme_id = None
+                                earned_incentive = 0
+                                
+                                if st.session_state.selected_offer:
+                                    scheme_id = st.session_state.selected_offer['scheme_id']
+                                    # Calculate per-item incentive
+                                    if item['product_id'] in st.session_state.selected_offer['applicable_products']:
+                                        if st.session_state.selected_offer['payout_type'] == 'Fixed':
+                                            earned_incentive = st.session_state.selected_offer['payout_amount'] * item['quantity']
+                                        elif st.session_state.selected_offer['payout_type'] == 'Percentage':
+                                            earned_incentive = (item['dealer_price'] * st.session_state.selected_offer['payout_amount'] / 100) * item['quantity']
+                                
+                                sale_rows.append((
+                                    selected_dealer_id,
+                                    scheme_id, 
+                                    item['product_id'], 
+                                    item['quantity'],
+                                    item['dealer_price'],
+                                    earned_incentive,
+                                    imei,
+                                    sale_ts,
+                                ))
                             
-                            # Record sale
-                            cursor.execute(""" 
+                            # Record all sales in one batch
+                            cursor.executemany(""" 
                             INSERT INTO sales_transactions (
                                 dealer_id, scheme_id, product_id, quantity_sold, dealer_price_dp,
                                 earned_dealer_incentive_amount, imei_serial, sale_timestamp
                             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                            """, ( 
-                                selected_dealer_id,
-                                scheme_id, 
-                                item['product_id'], 
-                                item['quantity'],
-                                item['dealer_price'],
-                                earned_incentive,
-                                imei,
-                                sale_ts,
-                            ))
-                        
-                        conn.commit()
-                        st.success("Transaction completed successfully!")
-                        
-                        # Clear cart
-                        st.session_state.cart_items = []
-                        st.session_state.selected_offer = None
-                        st.session_state.available_offers = []
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error recording transaction: {str(e)}")
-                        conn.rollback()
+                            """, sale_rows)
+                            
+                            conn.commit()
+                            clear_sales_queries()
+                            st.success("Transaction completed successfully!")
+                            
+                            # Clear cart
+                            st.session_state.cart_items = []
+                            st.session_state.selected_offer = None
+                            st.session_state.available_offers = []
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Error recording transaction: {str(e)}")
+                            conn.rollback()
             
             st.markdown("</div>", unsafe_allow_html=True)
         
@@ -1799,76 +1994,61 @@ def render_cart_mode():
                     if st.button("Apply Offer", key=f"apply_offer_{offer['scheme_id']}"):
                         st.session_state.selected_offer = offer
                         st.rerun()
-    
-    conn.close()
 
 def find_applicable_offers(cart_items, dealer_type, dealer_region, dealer_state, dealer_city):
     """Find offers applicable to the current cart"""
     if not cart_items:
         return []
     
-    conn = connect_db()
-    cursor = conn.cursor()
-    
-    # Get product IDs in cart
-    product_ids = [item['product_id'] for item in cart_items]
-    product_ids_str = ','.join('?' for _ in product_ids)
-    
-    # Calculate cart total
-    cart_total = sum(item['dealer_price'] * item['quantity'] for item in cart_items)
-    
-    # Find schemes that match dealer criteria and have products in the cart
-    cursor.execute(f"""
-    SELECT DISTINCT s.scheme_id, s.scheme_name, s.scheme_type, s.notes
-    FROM schemes s
-    JOIN scheme_products sp ON s.scheme_id = sp.scheme_id
-    WHERE s.deal_status = 'Active'
-    AND s.approval_status = 'Approved'
-    AND (s.dealer_type_eligibility = 'All Dealers' OR s.dealer_type_eligibility = ?)
-    AND (s.applicable_region = 'All India' OR s.applicable_region = ?)
-    AND sp.product_id IN ({product_ids_str})
-    AND datetime('now') BETWEEN datetime(s.scheme_period_start) AND datetime(s.scheme_period_end)
-    """, [dealer_type, dealer_region] + product_ids)
-    
-    schemes = cursor.fetchall()
-    
-    applicable_offers = []
-    
-    for scheme in schemes:
-        scheme_id = scheme[0]
-        scheme_name = scheme[1]
-        scheme_type = scheme[2]
-        notes = scheme[3] or ""
+    with get_db_pool().borrow() as conn:
+        cursor = conn.cursor()
         
-        # Get scheme products and their payout details
-        cursor.execute("""
-        SELECT sp.product_id, sp.support_type, sp.payout_type, sp.payout_amount, sp.payout_unit,
+        # Get product IDs in cart
+        product_ids = [item['product_id'] for item in cart_items]
+        product_ids_str = ','.join('?' for _ in product_ids)
+        
+        # Calculate cart total
+        cart_total = sum(item['dealer_price'] * item['quantity'] for item in cart_items)
+        
+        # Find the cart products of every scheme that matches the dealer criteria
+        cursor.execute(f"""
+        SELECT s.scheme_id, s.scheme_name, s.scheme_type, s.notes,
+               sp.product_id, sp.support_type, sp.payout_type, sp.payout_amount, sp.payout_unit,
                sp.is_bundle_offer, sp.is_upgrade_offer, sp.free_item_description
-        FROM scheme_products sp
-        WHERE sp.scheme_id = ?
-        """, (scheme_id,))
+        FROM schemes s
+        JOIN scheme_products sp ON s.scheme_id = sp.scheme_id
+        WHERE s.deal_status = 'Active'
+        AND s.approval_status = 'Approved'
+        AND (s.dealer_type_eligibility = 'All Dealers' OR s.dealer_type_eligibility = ?)
+        AND (s.applicable_region = 'All India' OR s.applicable_region = ?)
+        AND sp.product_id IN ({product_ids_str})
+        AND datetime(s.scheme_period_start) <= datetime('now') AND datetime(s.scheme_period_end) >= datetime('now')
+        ORDER BY s.scheme_id, sp.id
+        """, [dealer_type, dealer_region] + product_ids)
         
-        scheme_products = cursor.fetchall()
+        # Group the matching scheme products by scheme, keeping their order
+        schemes = {}
+        for row in cursor:
+            schemes.setdefault(row[0], []).append(row)
         
-        # Check if any products in cart match scheme products
-        applicable_products = []
-        for product in scheme_products:
-            product_id = product[0]
-            if product_id in product_ids:
-                applicable_products.append(product_id)
+        applicable_offers = []
         
-        if applicable_products:
+        for scheme_id, scheme_products in schemes.items():
+            scheme_name = scheme_products[0][1]
+            scheme_type = scheme_products[0][2]
+            notes = scheme_products[0][3] or ""
+            
+            applicable_products = [product[4] for product in scheme_products]
+            
             # Get payout details from first applicable product (simplified)
-            for product in scheme_products:
-                if product[0] in applicable_products:
-                    support_type = product[1]
-                    payout_type = product[2]
-                    payout_amount = product[3]
-                    payout_unit = product[4]
-                    is_bundle = product[5]
-                    is_upgrade = product[6]
-                    free_item = product[7]
-                    break
+            product = scheme_products[0]
+            support_type = product[5]
+            payout_type = product[6]
+            payout_amount = product[7]
+            payout_unit = product[8]
+            is_bundle = product[9]
+            is_upgrade = product[10]
+            free_item = product[11]
             
             # Create description based on scheme type and payout
             if payout_type == 'Fixed':
@@ -1897,7 +2077,6 @@ def find_applicable_offers(cart_items, dealer_type, dealer_region, dealer_state,
                 'free_item': free_item
             })
     
-    conn.close()
     return applicable_offers
 
 def calculate_offer_benefit(cart_items, offer):
@@ -1922,12 +2101,13 @@ def render_upload_scheme():
     secrets = load_secrets()
     
     # Initialize AWS clients
-    bedrock_client, textract_client = initialize_aws_clients(secrets)
+    bedrock_client, textract_client = get_aws_clients(secrets)
     
     # Upload form
     st.markdown("<h2 class='sub-header'>Upload Scheme Document</h2>", unsafe_allow_html=True)
     
     uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
+    use_ocr_cache = st.checkbox("Use OCR cache", value=True, help="Reuse Textract text for pages that were already OCR'd")
     
     if uploaded_file is not None:
         # Save uploaded file
@@ -1937,14 +2117,23 @@ def render_upload_scheme():
         
         file_path = os.path.join(uploads_dir, uploaded_file.name)
         
+        file_hash = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        
+        uploaded_file.seek(0)
         with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+            shutil.copyfileobj(uploaded_file, f, length=1 << 20)
         
         st.success(f"File uploaded successfully: {uploaded_file.name}")
         
         # Process PDF
         with st.spinner("Extracting text from PDF..."):
-            pages_text = extract_text_from_pdf(file_path, textract_client)
+            ocr_cache_dir = os.path.join(current_dir, '.ocr_cache') if use_ocr_cache else None
+            try:
+                pages_text = extract_pdf_pages(file_hash, file_path, textract_client, ocr_cache_dir)
+            except Exception as e:
+                # Keep whatever text can be recovered, without caching it
+                st.warning(f"Text extraction was incomplete: {str(e)}")
+                pages_text = extract_text_from_pdf(file_path, textract_client, ocr_cache_dir)
             
             if not pages_text or len(pages_text) == 0:
                 st.error("Failed to extract text from the PDF. Please try another file.")
@@ -1967,9 +2156,13 @@ def render_upload_scheme():
         with st.spinner("Extracting structured data..."):
             inference_profile_arn = secrets.get('INFERENCE_PROFILE_CLAUDE')
             
-            structured_data = extract_structured_data_from_text(
-                all_text, uploaded_file.name, bedrock_client, inference_profile_arn
-            )
+            try:
+                structured_data = extract_scheme_data(
+                    all_text, uploaded_file.name, bedrock_client, inference_profile_arn
+                )
+            except Exception as e:
+                st.warning(f"Claude extraction failed, using rule-based extraction: {str(e)}")
+                structured_data = rule_based_extraction(all_text, uploaded_file.name)
             
             if not structured_data:
                 st.error("Failed to extract structured data from the PDF. Please try another file.")
@@ -2039,9 +2232,10 @@ def render_upload_scheme():
         # Save to database button
         if st.button("Save to Database"):
             try:
-                # Connect to database
+                # Connect to database and save everything in one transaction
                 conn = connect_db()
                 cursor = conn.cursor()
+                cursor.execute("BEGIN")
 
                 # --- 2.a  NORMALISE the top‑level scheme fields -----------------
                 scheme_name = normalize_field(structured_data.get("scheme_name"), str, "Unnamed Scheme")
@@ -2075,7 +2269,9 @@ def render_upload_scheme():
                 )
                 scheme_id = cursor.lastrowid
 
-                # --- 2.c  Loop through products with *all* fields normalised ----
+                # --- 2.c  Normalise every product and its scheme_products fields -
+                product_rows = []
+                scheme_product_fields = []
                 for product_data in structured_data.get("products", []):
                     # Normalise every relevant attribute using `normalize_field`
                     product_name = normalize_field(product_data.get("product_name"), str, f"Product {uuid.uuid4().hex[:8]}")
@@ -2089,38 +2285,21 @@ def render_upload_scheme():
                     dealer_price_dp = normalize_field(product_data.get("dealer_price_dp"), float, 10000.0)
                     mrp = normalize_field(product_data.get("mrp"), float, dealer_price_dp * 1.2)
 
-                    # Check if the product already exists
-                    cursor.execute(
-                        """SELECT product_id FROM products WHERE product_name=? AND product_code=?""",
-                        (product_name, product_code),
-                    )
-                    row = cursor.fetchone()
-                    if row:
-                        product_id = row[0]
-                    else:
-                        cursor.execute(
-                            """
-                            INSERT INTO products (
-                                product_name, product_code, product_category, product_subcategory,
-                                ram, storage, connectivity, color, dealer_price_dp, mrp
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            """,
-                            (
-                                product_name,
-                                product_code,
-                                product_category,
-                                product_subcategory,
-                                ram,
-                                storage,
-                                connectivity,
-                                color,
-                                dealer_price_dp,
-                                mrp,
-                            ),
+                    product_rows.append(
+                        (
+                            product_name,
+                            product_code,
+                            product_category,
+                            product_subcategory,
+                            ram,
+                            storage,
+                            connectivity,
+                            color,
+                            dealer_price_dp,
+                            mrp,
                         )
-                        product_id = cursor.lastrowid
+                    )
 
-                    # --- 2.d  Insert into scheme_products (also normalised) ------
                     support_type = normalize_field(product_data.get("support_type"), str, scheme_type)
                     payout_type = normalize_field(product_data.get("payout_type"), str, "Fixed")
                     payout_amount = normalize_field(product_data.get("payout_amount"), float, 0.0)
@@ -2132,17 +2311,8 @@ def render_upload_scheme():
                     is_upgrade_offer = 1 if product_data.get("is_upgrade_offer", False) else 0
                     free_item_description = normalize_field(product_data.get("free_item_description"), str)
 
-                    cursor.execute(
-                        """
-                        INSERT INTO scheme_products (
-                            scheme_id, product_id, support_type, payout_type, payout_amount,
-                            payout_unit, dealer_contribution, total_payout, is_bundle_offer,
-                            bundle_price, is_upgrade_offer, free_item_description
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """,
+                    scheme_product_fields.append(
                         (
-                            scheme_id,
-                            product_id,
                             support_type,
                             payout_type,
                             payout_amount,
@@ -2153,25 +2323,55 @@ def render_upload_scheme():
                             bundle_price,
                             is_upgrade_offer,
                             free_item_description,
-                        ),
+                        )
                     )
 
-                # --- 2.e  Insert rules (also safe) ------------------------------
-                for rule_data in structured_data.get("scheme_rules", []):
-                    cursor.execute(
-                        """
-                        INSERT INTO scheme_rules (scheme_id, rule_type, rule_description, rule_value)
-                        VALUES (?, ?, ?, ?)
-                        """,
+                # --- 2.d  Reuse existing products, insert new ones in one batch -
+                existing_products = resolve_product_ids(
+                    cursor,
+                    [
+                        "product_name", "product_code", "product_category", "product_subcategory",
+                        "ram", "storage", "connectivity", "color", "dealer_price_dp", "mrp",
+                    ],
+                    product_rows,
+                )
+
+                # --- 2.e  Collect the scheme_products rows -----------------------
+                scheme_product_rows = [
+                    (scheme_id, existing_products[(row[0], row[1])]) + fields
+                    for row, fields in zip(product_rows, scheme_product_fields)
+                ]
+
+                cursor.executemany(
+                    """
+                    INSERT INTO scheme_products (
+                        scheme_id, product_id, support_type, payout_type, payout_amount,
+                        payout_unit, dealer_contribution, total_payout, is_bundle_offer,
+                        bundle_price, is_upgrade_offer, free_item_description
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    scheme_product_rows,
+                )
+
+                # --- 2.f  Insert rules (also safe) ------------------------------
+                cursor.executemany(
+                    """
+                    INSERT INTO scheme_rules (scheme_id, rule_type, rule_description, rule_value)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    [
                         (
                             scheme_id,
                             normalize_field(rule_data.get("rule_type"), str, "General"),
                             normalize_field(rule_data.get("rule_description"), str, "No description"),
                             normalize_field(rule_data.get("rule_value"), str),
-                        ),
-                    )
+                        )
+                        for rule_data in structured_data.get("scheme_rules", [])
+                    ],
+                )
 
                 conn.commit()
+                clear_cached_queries()
                 st.success("Scheme saved to database successfully!")
                 st.session_state.page = "schemes"
                 st.rerun()
@@ -2191,102 +2391,110 @@ def render_approvals():
     """Render the approvals page"""
     st.markdown("<h1 class='main-header'>Pending Approvals</h1>", unsafe_allow_html=True)
     
-    # Connect to database
-    conn = connect_db()
-    cursor = conn.cursor()
-    
     # Get pending approvals
-    cursor.execute("""
-    SELECT sa.approval_id, s.scheme_id, s.scheme_name, sa.requested_by, sa.approval_notes, sa.approval_status
-    FROM scheme_approvals sa
-    JOIN schemes s ON sa.scheme_id = s.scheme_id
-    WHERE sa.approval_status = 'Pending'
-    ORDER BY sa.approval_id DESC
-    """)
-    
-    approvals = cursor.fetchall()
-    
-    if approvals and len(approvals) > 0:
-        for approval in approvals:
-            st.markdown("<div class='card'>", unsafe_allow_html=True)
-            
-            col1, col2 = st.columns([3, 1])
-            
-            with col1:
-                st.markdown(f"### Scheme: {approval['scheme_name']}")
-                st.markdown(f"**Requested By:** {approval['requested_by']}")
-                st.markdown(f"**Notes:** {approval['approval_notes']}")
+    with get_db_pool().borrow() as conn:
+        approvals_df = pd.read_sql_query("""
+        SELECT sa.approval_id, s.scheme_id, s.scheme_name, sa.requested_by, sa.approval_notes, sa.approval_status
+        FROM scheme_approvals sa
+        JOIN schemes s ON sa.scheme_id = s.scheme_id
+        WHERE sa.approval_status = 'Pending'
+        ORDER BY sa.approval_id DESC
+        """, conn)
+    
+    if not approvals_df.empty:
+        # Pending approvals as one table, selecting a row to review it
+        event = st.dataframe(
+            approvals_df,
+            hide_index=True,
+            use_container_width=True,
+            column_order=['scheme_name', 'requested_by', 'approval_notes', 'approval_status'],
+            column_config={
+                'scheme_name': st.column_config.TextColumn("Scheme"),
+                'requested_by': st.column_config.TextColumn("Requested By"),
+                'approval_notes': st.column_config.TextColumn("Notes"),
+                'approval_status': st.column_config.TextColumn("Status")
+            },
+            key="approvals_table",
+            on_select="rerun",
+            selection_mode="single-row"
+        )
+        
+        if not event.selection.rows:
+            st.info("Select a scheme in the table to review it.")
+        else:
+            approval = approvals_df.iloc[event.selection.rows[0]]
+            approval_id = int(approval['approval_id'])
+            scheme_id = int(approval['scheme_id'])
             
-            with col2:
-                st.markdown(f"**Status:** {approval['approval_status']}")
-                
-                # Get scheme details
-                cursor.execute("SELECT * FROM schemes WHERE scheme_id = ?", (approval['scheme_id'],))
-                scheme = cursor.fetchone()
-                
-                if scheme:
-                    if st.button("View Details", key=f"view_approval_{approval['approval_id']}"):
-                        st.session_state.selected_scheme_id = approval['scheme_id']
-                        st.session_state.page = 'scheme_details'
+            st.markdown(f"### Scheme: {approval['scheme_name']}")
             
             # Approval actions
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             
             with col1:
-                if st.button("Approve", key=f"approve_{approval['approval_id']}"):
-                    try:
-                        # Update approval status
-                        cursor.execute("""
-                        UPDATE scheme_approvals
-                        SET approval_status = 'Approved', approved_by = ?, approved_at = CURRENT_TIMESTAMP
-                        WHERE approval_id = ?
-                        """, ("Current User", approval['approval_id']))
-                        
-                        # Update scheme approval status
-                        cursor.execute("""
-                        UPDATE schemes
-                        SET approval_status = 'Approved', approved_by = ?, approval_timestamp = CURRENT_TIMESTAMP
-                        WHERE scheme_id = ?
-                        """, ("Current User", approval['scheme_id']))
-                        
-                        conn.commit()
-                        st.success("Scheme approved successfully!")
-                        st.rerun()
-                    
-                    except Exception as e:
-                        conn.rollback()
-                        st.error(f"Error approving scheme: {str(e)}")
+                if st.button("View Details", key=f"view_approval_{approval_id}"):
+                    st.session_state.selected_scheme_id = scheme_id
+                    st.session_state.page = 'scheme_details'
             
             with col2:
-                if st.button("Reject", key=f"reject_{approval['approval_id']}"):
-                    try:
-                        # Update approval status
-                        cursor.execute("""
-                        UPDATE scheme_approvals
-                        SET approval_status = 'Rejected', approved_by = ?, approved_at = CURRENT_TIMESTAMP
-                        WHERE approval_id = ?
-                        """, ("Current User", approval['approval_id']))
+                if st.button("Approve", key=f"approve_{approval_id}"):
+                    with get_db_pool().borrow() as conn:
+                        cursor = conn.cursor()
                         
-                        # Update scheme approval status
-                        cursor.execute("""
-                        UPDATE schemes
-                        SET approval_status = 'Rejected'
-                        WHERE scheme_id = ?
-                        """, (approval['scheme_id'],))
+                        try:
+                            # Update approval status
+                            cursor.execute("""
+                            UPDATE scheme_approvals
+                            SET approval_status = 'Approved', approved_by = ?, approved_at = CURRENT_TIMESTAMP
+                            WHERE approval_id = ?
+                            """, ("Current User", approval_id))
+                            
+                            # Update scheme approval status
+                            cursor.execute("""
+                            UPDATE schemes
+                            SET approval_status = 'Approved', approved_by = ?, approval_timestamp = CURRENT_TIMESTAMP
+                            WHERE scheme_id = ?
+                            """, ("Current User", scheme_id))
+                            
+                            conn.commit()
+                            clear_cached_queries()
+                            st.success("Scheme approved successfully!")
+                            st.rerun()
                         
-                        conn.commit()
-                        st.success("Scheme rejected successfully!")
-                        st.rerun()
-                    
-                    except Exception as e:
-                        conn.rollback()
-                        st.error(f"Error rejecting scheme: {str(e)}")
+                        except Exception as e:
+                            conn.rollback()
+                            st.error(f"Error approving scheme: {str(e)}")
             
-            st.markdown("</div>", unsafe_allow_html=True)
+            with col3:
+                if st.button("Reject", key=f"reject_{approval_id}"):
+                    with get_db_pool().borrow() as conn:
+                        cursor = conn.cursor()
+                        
+                        try:
+                            # Update approval status
+                            cursor.execute("""
+                            UPDATE scheme_approvals
+                            SET approval_status = 'Rejected', approved_by = ?, approved_at = CURRENT_TIMESTAMP
+                            WHERE approval_id = ?
+                            """, ("Current User", approval_id))
+                            
+                            # Update scheme approval status
+                            cursor.execute("""
+                            UPDATE schemes
+                            SET approval_status = 'Rejected'
+                            WHERE scheme_id = ?
+                            """, (scheme_id,))
+                            
+                            conn.commit()
+                            clear_cached_queries()
+                            st.success("Scheme rejected successfully!")
+                            st.rerun()
+                        
+                        except Exception as e:
+                            conn.rollback()
+                            st.error(f"Error rejecting scheme: {str(e)}")
     else:
         st.info("No pending approvals found.")
-    
-    conn.close()
 
 # Settings
 def render_settings():
@@ -2339,6 +2547,7 @@ def render_settings():
             with open(secrets_path, 'w') as f:
                 json.dump(updated_secrets, f, indent=4)
             
+            read_secrets_file.clear()
             st.success("Settings saved successfully!")
         
         except Exception as e:
@@ -2387,6 +2596,7 @@ def render_settings():
                 # Add sample data
                 from pdf_processor_fixed import add_sample_data
                 add_sample_data()
+                clear_cached_queries()
                 
                 st.success("Sample data reset successfully!")
             
@@ -0,0 +1,57 @@
+import sqlite3
+import queue
+from contextlib import contextmanager
+
+# Connection pool
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared between threads"""
+
+    def __init__(self, db_path, size=4, timeout=30):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._pool = queue.Queue(maxsize=size)
+
+        # Connections are opened lazily, the first time each slot is borrowed
+        for _ in range(size):
+            self._pool.put(None)
+
+    def _connect(self):
+        """Open a connection with the pragmas used by every pooled connection"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+        return conn
+
+    @contextmanager
+    def borrow(self):
+        """Borrow a connection, waiting up to the pool timeout if all of them are in use"""
+        try:
+            conn = self._pool.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No pooled connection became free within {self.timeout}s; a borrower may be holding one too long"
+            )
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            yield conn
+        finally:
+            # Never hand an open transaction to the next borrower
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def close(self):
+        """Close every connection currently in the pool"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                conn.close()
@@ -1,15 +1,13 @@
 import os
 import sqlite3
 import json
-import fitz  # PyMuPDF
-import tempfile
 import random
 import datetime
-import boto3
-from PIL import Image
-import io
 import re
 import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import numpy as np
 import streamlit as st
 
 # Database connection
@@ -17,8 +15,13 @@ def connect_db():
     """Connect to the SQLite database"""
     current_dir = os.path.dirname(os.path.abspath(__file__))
     db_path = os.path.join(current_dir, 'dns_database.db')
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    
+    # Match the pooled connections so bulk loads and admin writes also run in WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
 # Create database tables
@@ -207,15 +210,251 @@ def create_tables():
     )
     ''')
     
+    create_indexes(cursor)
+    create_sales_summaries(cursor)
+    
     conn.commit()
     conn.close()
     
     print("All tables created successfully.")
 
+# Create database indexes
+def create_indexes(cursor):
+    """Create indexes for the joins and filters used by the app"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_scheme_ts ON sales_transactions(scheme_id, sale_timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_product ON sales_transactions(product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_dealer_ts ON sales_transactions(dealer_id, sale_timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_ts ON sales_transactions(sale_timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheme_products_scheme ON scheme_products(scheme_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheme_products_product ON scheme_products(product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_name_code ON products(product_name, product_code)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_schemes_status ON schemes(deal_status, approval_status, upload_timestamp DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_active ON products(is_active, product_category, product_subcategory)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dealers_active ON dealers(is_active, region)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheme_rules_scheme ON scheme_rules(scheme_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheme_parameters_scheme ON scheme_parameters(scheme_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payout_slabs_scheme_product ON payout_slabs(scheme_product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheme_approvals_status ON scheme_approvals(approval_status, approval_id DESC)")
+    
+    # Periods are compared through datetime(), so an index on them only added write cost
+    cursor.execute("DROP INDEX IF EXISTS idx_schemes_status_period")
+
+# Create sales summary tables
+def create_sales_summaries(cursor):
+    """Create sales totals per scheme, dealer, product and product/scheme pair, kept current by triggers"""
+    # A database with the product summary and the update trigger is fully set up
+    cursor.execute("""
+    SELECT COUNT(*) FROM sqlite_master
+    WHERE (type = 'table' AND name = 'mv_product_sales') OR (type = 'trigger' AND name = 'trg_sales_summary_update')
+    """)
+    if cursor.fetchone()[0] == 2:
+        return
+    
+    # Triggers from an older setup do not maintain every summary, so replace them
+    cursor.execute("DROP TRIGGER IF EXISTS trg_sales_summary_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS trg_sales_summary_delete")
+    cursor.execute("DROP TRIGGER IF EXISTS trg_sales_summary_update")
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS mv_scheme_sales (
+        scheme_id INTEGER PRIMARY KEY,
+        sales_count INTEGER NOT NULL,
+        total_incentive REAL NOT NULL
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS mv_dealer_sales (
+        dealer_id INTEGER PRIMARY KEY,
+        sales_count INTEGER NOT NULL,
+        total_incentive REAL NOT NULL
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS mv_product_sales (
+        product_id INTEGER PRIMARY KEY,
+        sales_count INTEGER NOT NULL,
+        total_incentive REAL NOT NULL
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS mv_product_scheme_sales (
+        product_id INTEGER,
+        scheme_id INTEGER,
+        sales_count INTEGER NOT NULL,
+        PRIMARY KEY (product_id, scheme_id)
+    )
+    ''')
+    
+    # Seed the summaries from the sales recorded so far
+    rebuild_sales_summaries(cursor)
+    
+    # Add each new sale to its totals
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_sales_summary_insert
+    AFTER INSERT ON sales_transactions
+    BEGIN
+        INSERT INTO mv_scheme_sales (scheme_id, sales_count, total_incentive)
+        SELECT NEW.scheme_id, 1, COALESCE(NEW.earned_dealer_incentive_amount, 0) WHERE NEW.scheme_id IS NOT NULL
+        ON CONFLICT (scheme_id) DO UPDATE SET
+            sales_count = sales_count + 1,
+            total_incentive = total_incentive + excluded.total_incentive;
+        
+        INSERT INTO mv_dealer_sales (dealer_id, sales_count, total_incentive)
+        SELECT NEW.dealer_id, 1, COALESCE(NEW.earned_dealer_incentive_amount, 0) WHERE NEW.dealer_id IS NOT NULL
+        ON CONFLICT (dealer_id) DO UPDATE SET
+            sales_count = sales_count + 1,
+            total_incentive = total_incentive + excluded.total_incentive;
+        
+        INSERT INTO mv_product_sales (product_id, sales_count, total_incentive)
+        SELECT NEW.product_id, 1, COALESCE(NEW.earned_dealer_incentive_amount, 0) WHERE NEW.product_id IS NOT NULL
+        ON CONFLICT (product_id) DO UPDATE SET
+            sales_count = sales_count + 1,
+            total_incentive = total_incentive + excluded.total_incentive;
+        
+        INSERT INTO mv_product_scheme_sales (product_id, scheme_id, sales_count)
+        SELECT NEW.product_id, NEW.scheme_id, 1 WHERE NEW.product_id IS NOT NULL AND NEW.scheme_id IS NOT NULL
+        ON CONFLICT (product_id, scheme_id) DO UPDATE SET
+            sales_count = sales_count + 1;
+    END
+    ''')
+    
+    # Take deleted sales back out, dropping totals that reach zero sales
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_sales_summary_delete
+    AFTER DELETE ON sales_transactions
+    BEGIN
+        UPDATE mv_scheme_sales
+        SET sales_count = sales_count - 1,
+            total_incentive = total_incentive - COALESCE(OLD.earned_dealer_incentive_amount, 0)
+        WHERE scheme_id = OLD.scheme_id;
+        DELETE FROM mv_scheme_sales WHERE scheme_id = OLD.scheme_id AND sales_count <= 0;
+        
+        UPDATE mv_dealer_sales
+        SET sales_count = sales_count - 1,
+            total_incentive = total_incentive - COALESCE(OLD.earned_dealer_incentive_amount, 0)
+        WHERE dealer_id = OLD.dealer_id;
+        DELETE FROM mv_dealer_sales WHERE dealer_id = OLD.dealer_id AND sales_count <= 0;
+        
+        UPDATE mv_product_sales
+        SET sales_count = sales_count - 1,
+            total_incentive = total_incentive - COALESCE(OLD.earned_dealer_incentive_amount, 0)
+        WHERE product_id = OLD.product_id;
+        DELETE FROM mv_product_sales WHERE product_id = OLD.product_id AND sales_count <= 0;
+        
+        UPDATE mv_product_scheme_sales
+        SET sales_count = sales_count - 1
+        WHERE product_id = OLD.product_id AND scheme_id = OLD.scheme_id;
+        DELETE FROM mv_product_scheme_sales
+        WHERE product_id = OLD.product_id AND scheme_id = OLD.scheme_id AND sales_count <= 0;
+    END
+    ''')
+    
+    # Move an edited sale from its old totals to its new ones
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_sales_summary_update
+    AFTER UPDATE OF scheme_id, dealer_id, product_id, earned_dealer_incentive_amount ON sales_transactions
+    BEGIN
+        UPDATE mv_scheme_sales
+        SET sales_count = sales_count - 1,
+            total_incentive = total_incentive - COALESCE(OLD.earned_dealer_incentive_amount, 0)
+        WHERE scheme_id = OLD.scheme_id;
+        DELETE FROM mv_scheme_sales WHERE scheme_id = OLD.scheme_id AND sales_count <= 0;
+        
+        UPDATE mv_dealer_sales
+        SET sales_count = sales_count - 1,
+            total_incentive = total_incentive - COALESCE(OLD.earned_dealer_incentive_amount, 0)
+        WHERE dealer_id = OLD.dealer_id;
+        DELETE FROM mv_dealer_sales WHERE dealer_id = OLD.dealer_id AND sales_count <= 0;
+        
+        UPDATE mv_product_sales
+        SET sales_count = sales_count - 1,
+            total_incentive = total_incentive - COALESCE(OLD.earned_dealer_incentive_amount, 0)
+        WHERE product_id = OLD.product_id;
+        DELETE FROM mv_product_sales WHERE product_id = OLD.product_id AND sales_count <= 0;
+        
+        UPDATE mv_product_scheme_sales
+        SET sales_count = sales_count - 1
+        WHERE product_id = OLD.product_id AND scheme_id = OLD.scheme_id;
+        DELETE FROM mv_product_scheme_sales
+        WHERE product_id = OLD.product_id AND scheme_id = OLD.scheme_id AND sales_count <= 0;
+        
+        INSERT INTO mv_scheme_sales (scheme_id, sales_count, total_incentive)
+        SELECT NEW.scheme_id, 1, COALESCE(NEW.earned_dealer_incentive_amount, 0) WHERE NEW.scheme_id IS NOT NULL
+        ON CONFLICT (scheme_id) DO UPDATE SET
+            sales_count = sales_count + 1,
+            total_incentive = total_incentive + excluded.total_incentive;
+        
+        INSERT INTO mv_dealer_sales (dealer_id, sales_count, total_incentive)
+        SELECT NEW.dealer_id, 1, COALESCE(NEW.earned_dealer_incentive_amount, 0) WHERE NEW.dealer_id IS NOT NULL
+        ON CONFLICT (dealer_id) DO UPDATE SET
+            sales_count = sales_count + 1,
+            total_incentive = total_incentive + excluded.total_incentive;
+        
+        INSERT INTO mv_product_sales (product_id, sales_count, total_incentive)
+        SELECT NEW.product_id, 1, COALESCE(NEW.earned_dealer_incentive_amount, 0) WHERE NEW.product_id IS NOT NULL
+        ON CONFLICT (product_id) DO UPDATE SET
+            sales_count = sales_count + 1,
+            total_incentive = total_incentive + excluded.total_incentive;
+        
+        INSERT INTO mv_product_scheme_sales (product_id, scheme_id, sales_count)
+        SELECT NEW.product_id, NEW.scheme_id, 1 WHERE NEW.product_id IS NOT NULL AND NEW.scheme_id IS NOT NULL
+        ON CONFLICT (product_id, scheme_id) DO UPDATE SET
+            sales_count = sales_count + 1;
+    END
+    ''')
+
+# Rebuild the sales summaries
+def rebuild_sales_summaries(cursor):
+    """Recompute the sales summary tables from sales_transactions"""
+    cursor.execute("DELETE FROM mv_scheme_sales")
+    cursor.execute("DELETE FROM mv_dealer_sales")
+    cursor.execute("DELETE FROM mv_product_sales")
+    cursor.execute("DELETE FROM mv_product_scheme_sales")
+    
+    cursor.execute('''
+    INSERT INTO mv_scheme_sales (scheme_id, sales_count, total_incentive)
+    SELECT scheme_id, COUNT(*), TOTAL(earned_dealer_incentive_amount)
+    FROM sales_transactions
+    WHERE scheme_id IS NOT NULL
+    GROUP BY scheme_id
+    ''')
+    
+    cursor.execute('''
+    INSERT INTO mv_dealer_sales (dealer_id, sales_count, total_incentive)
+    SELECT dealer_id, COUNT(*), TOTAL(earned_dealer_incentive_amount)
+    FROM sales_transactions
+    WHERE dealer_id IS NOT NULL
+    GROUP BY dealer_id
+    ''')
+    
+    cursor.execute('''
+    INSERT INTO mv_product_sales (product_id, sales_count, total_incentive)
+    SELECT product_id, COUNT(*), TOTAL(earned_dealer_incentive_amount)
+    FROM sales_transactions
+    WHERE product_id IS NOT NULL
+    GROUP BY product_id
+    ''')
+    
+    cursor.execute('''
+    INSERT INTO mv_product_scheme_sales (product_id, scheme_id, sales_count)
+    SELECT product_id, scheme_id, COUNT(*)
+    FROM sales_transactions
+    WHERE product_id IS NOT NULL AND scheme_id IS NOT NULL
+    GROUP BY product_id, scheme_id
+    ''')
+
 # Initialize AWS clients
+TEXTRACT_MAX_ATTEMPTS = 6
+
 def initialize_aws_clients(secrets):
     """Initialize AWS clients for Bedrock and Textract"""
     try:
+        import boto3
+        from botocore.config import Config
+        
         # Initialize Bedrock client
         bedrock_client = boto3.client(
             'bedrock-runtime',
@@ -224,12 +463,13 @@ def initialize_aws_clients(secrets):
             aws_secret_access_key=secrets.get('aws_secret_access_key')
         )
         
-        # Initialize Textract client
+        # Initialize Textract client, letting botocore rate-limit and retry throttled OCR calls
         textract_client = boto3.client(
             'textract',
             region_name=secrets.get('REGION', 'ap-south-1'),
             aws_access_key_id=secrets.get('aws_access_key_id'),
-            aws_secret_access_key=secrets.get('aws_secret_access_key')
+            aws_secret_access_key=secrets.get('aws_secret_access_key'),
+            config=Config(retries={'mode': 'adaptive', 'total_max_attempts': TEXTRACT_MAX_ATTEMPTS})
         )
         
         return bedrock_client, textract_client
@@ -237,74 +477,127 @@ def initialize_aws_clients(secrets):
         print(f"Error initializing AWS clients: {e}")
         return None, None
 
+# OCR a rendered page with Textract
+def ocr_page_image(textract_client, image_bytes, cache_dir=None):
+    """Return the text lines Textract detects in a page image, reusing cached text for identical pages"""
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, hashlib.sha256(image_bytes).hexdigest() + ".txt")
+        
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return f.read()
+    
+    response = textract_client.detect_document_text(
+        Document={'Bytes': image_bytes}
+    )
+    
+    # Extract text from OCR results
+    text_lines = []
+    for block in response.get('Blocks', []):
+        if block['BlockType'] == 'LINE' and 'Text' in block:
+            text_lines.append(block['Text'])
+    
+    text = "\n".join(text_lines)
+    
+    # Write through a temp file so a concurrent reader never sees a partial entry
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, cache_path)
+    
+    return text
+
+# Gather finished OCR pages
+def collect_ocr_results(futures, pending, page_texts, failed_pages):
+    """Store the text of finished OCR futures, keeping the PyMuPDF text of pages that failed"""
+    for future in futures:
+        page_num = pending.pop(future)
+        
+        try:
+            page_texts[page_num] = future.result()
+        except Exception as e:
+            print(f"Textract error on page {page_num + 1}: {str(e)}")
+            # Fall back to PyMuPDF text
+            failed_pages.append(page_num + 1)
+    
+    return len(futures)
+
 # Extract text from PDF
-def extract_text_from_pdf(file_path, textract_client=None):
-    """Extract text from PDF using PyMuPDF and optionally AWS Textract"""
+TEXTRACT_MAX_WORKERS = 10
+TEXTRACT_MAX_IN_FLIGHT = 2 * TEXTRACT_MAX_WORKERS
+
+def extract_text_from_pdf(file_path, textract_client=None, ocr_cache_dir=None, strict=False, show_progress=True):
+    """Extract text from PDF using PyMuPDF and optionally AWS Textract, raising instead of degrading when strict"""
     try:
+        import fitz  # PyMuPDF
+        
         doc = fitz.open(file_path)
-        pages_text = []
+        page_count = len(doc)
+        page_texts = {}
+        pending = {}
+        failed_pages = []
+        completed = 0
         
-        # Create a progress placeholder if in Streamlit context
-        processing_message_placeholder = st.empty() if 'st' in globals() else None
-        progress_bar = st.progress(0) if 'st' in globals() else None
+        # Create a progress placeholder if in Streamlit context and the caller wants one
+        processing_message_placeholder = st.empty() if show_progress and 'st' in globals() else None
+        progress_bar = st.progress(0) if show_progress and 'st' in globals() else None
         
-        for page_num in range(len(doc)):
-            if processing_message_placeholder:
-                processing_message_placeholder.write(f"Processing page {page_num + 1}/{len(doc)}...")
-            
-            temp_image_path = None
-            
-            try:
-                # First try direct text extraction with PyMuPDF
-                page = doc.load_page(page_num)
-                text = page.get_text()
+        with ThreadPoolExecutor(max_workers=TEXTRACT_MAX_WORKERS) as executor:
+            for page_num in range(page_count):
+                if processing_message_placeholder:
+                    processing_message_placeholder.write(f"Processing page {page_num + 1}/{page_count}...")
                 
-                # If text is too short, try OCR with Textract
-                if len(text.strip()) < 100 and textract_client:
-                    # Render page as an image
-                    pix = page.get_pixmap()
-                    temp_image_path = os.path.join(tempfile.gettempdir(), f"page_{page_num}.png")
-                    pix.save(temp_image_path)
-                    
-                    with open(temp_image_path, "rb") as image_file:
-                        image_bytes = image_file.read()
+                try:
+                    # First try direct text extraction with PyMuPDF
+                    page = doc.load_page(page_num)
+                    text = page.get_text()
+                    page_texts[page_num] = text
                     
-                    # Use Textract for OCR
-                    try:
-                        response = textract_client.detect_document_text(
-                            Document={'Bytes': image_bytes}
-                        )
-                        
-                        # Extract text from OCR results
-                        text_lines = []
-                        for block in response.get('Blocks', []):
-                            if block['BlockType'] == 'LINE' and 'Text' in block:
-                                text_lines.append(block['Text'])
-                        
-                        text = "\n".join(text_lines)
-                    except Exception as e:
-                        print(f"Textract error on page {page_num + 1}: {str(e)}")
-                        # Fall back to PyMuPDF text
+                    # If text is too short, hand the rendered page to Textract and move on
+                    if len(text.strip()) < 100 and textract_client:
+                        image_bytes = page.get_pixmap().tobytes("png")
+                        future = executor.submit(ocr_page_image, textract_client, image_bytes, ocr_cache_dir)
+                        pending[future] = page_num
+                    else:
+                        completed += 1
                 
-                pages_text.append((page_num + 1, text, text))
-            
-            except Exception as e:
-                if 'st' in globals():
-                    st.error(f"Error processing page {page_num + 1}: {str(e)}")
-                else:
-                    print(f"Error processing page {page_num + 1}: {str(e)}")
-                continue
-            
-            finally:
-                if temp_image_path and os.path.exists(temp_image_path):
-                    os.remove(temp_image_path)
+                except Exception as e:
+                    if strict:
+                        raise
+                    if 'st' in globals():
+                        st.error(f"Error processing page {page_num + 1}: {str(e)}")
+                    else:
+                        print(f"Error processing page {page_num + 1}: {str(e)}")
+                    completed += 1
+                
+                # Bound the rendered pages held in memory while Textract catches up
+                if len(pending) >= TEXTRACT_MAX_IN_FLIGHT:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    completed += collect_ocr_results(done, pending, page_texts, failed_pages)
+                
+                if progress_bar:
+                    progress_bar.progress(completed / page_count)
             
-            if progress_bar:
-                progress_bar.progress((page_num + 1) / len(doc))
+            # Wait for the pages still being OCR'd
+            for future in as_completed(list(pending)):
+                completed += collect_ocr_results([future], pending, page_texts, failed_pages)
+                
+                if processing_message_placeholder:
+                    processing_message_placeholder.write(f"OCR complete for {completed}/{page_count} pages...")
+                if progress_bar:
+                    progress_bar.progress(completed / page_count)
         
-        return pages_text
+        if strict and failed_pages:
+            raise RuntimeError(f"Textract failed on pages {', '.join(map(str, sorted(failed_pages)))}")
+        
+        return [(page_num + 1, text, text) for page_num, text in sorted(page_texts.items())]
     
     except Exception as e:
+        if strict:
+            raise
         if 'st' in globals():
             st.error(f"Error extracting text from PDF: {str(e)}")
         else:
@@ -338,56 +631,117 @@ def normalize_field(field, field_type=str, default=None):
     except (ValueError, TypeError):
         return default
 
+# Prompt for structured scheme extraction
+SCHEME_EXTRACTION_PROMPT = """
+You are a specialized AI for extracting structured data from mobile phone scheme documents.
+
+Document: {document_name}
+
+Extract the following information in JSON format:
+1. scheme_name: The name of the scheme
+2. scheme_type: Type of scheme (e.g., Special Support, RCM, Upgrade Program)
+3. scheme_period_start: Start date in YYYY-MM-DD format
+4. scheme_period_end: End date in YYYY-MM-DD format
+5. applicable_region: Region where the scheme is applicable
+6. dealer_type_eligibility: Types of dealers eligible for this scheme
+7. products: Array of products with these fields:
+   - product_name: Full name of the product
+   - product_code: Product code if available
+   - product_category: Category (e.g., Mobile, Tablet)
+   - product_subcategory: Subcategory (e.g., S Series, A Series)
+   - ram: RAM specification if available
+   - storage: Storage specification if available
+   - connectivity: Connectivity options if available
+   - support_type: Type of support (e.g., Cashback, Exchange)
+   - payout_type: Type of payout (Fixed, Percentage)
+   - payout_amount: Amount of payout
+   - payout_unit: Unit of payout (e.g., INR, %)
+   - dealer_contribution: Dealer's contribution if any
+   - total_payout: Total payout amount
+   - is_bundle_offer: Boolean indicating if it's a bundle offer
+   - bundle_price: Price of the bundle if applicable
+   - is_upgrade_offer: Boolean indicating if it's an upgrade offer
+   - free_item_description: Description of any free items included with the product (e.g., "Galaxy Buds2 Pro", "Galaxy Watch4", etc.)
+8. scheme_rules: Array of rules with these fields:
+   - rule_type: Type of rule
+   - rule_description: Description of the rule
+   - rule_value: Value or threshold for the rule
+
+Here's the document text:
+{text}
+
+Return only the JSON object without any additional text.
+"""
+
+# Tool schema that constrains the Claude response to the fields above
+SCHEME_EXTRACTION_TOOL = {
+    "name": "record_scheme",
+    "description": "Record the structured data extracted from a scheme document",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "scheme_name": {"type": "string"},
+            "scheme_type": {"type": ["string", "null"]},
+            "scheme_period_start": {"type": ["string", "null"], "description": "YYYY-MM-DD"},
+            "scheme_period_end": {"type": ["string", "null"], "description": "YYYY-MM-DD"},
+            "applicable_region": {"type": ["string", "null"]},
+            "dealer_type_eligibility": {"type": ["string", "null"]},
+            "products": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "product_name": {"type": "string"},
+                        "product_code": {"type": ["string", "null"]},
+                        "product_category": {"type": ["string", "null"]},
+                        "product_subcategory": {"type": ["string", "null"]},
+                        "ram": {"type": ["string", "null"]},
+                        "storage": {"type": ["string", "null"]},
+                        "connectivity": {"type": ["string", "null"]},
+                        "support_type": {"type": ["string", "null"]},
+                        "payout_type": {"type": ["string", "null"], "enum": ["Fixed", "Percentage", None]},
+                        "payout_amount": {"type": ["number", "null"]},
+                        "payout_unit": {"type": ["string", "null"]},
+                        "dealer_contribution": {"type": ["number", "null"]},
+                        "total_payout": {"type": ["number", "null"]},
+                        "is_bundle_offer": {"type": "boolean"},
+                        "bundle_price": {"type": ["number", "null"]},
+                        "is_upgrade_offer": {"type": "boolean"},
+                        "free_item_description": {"type": ["string", "null"]}
+                    },
+                    "required": ["product_name"]
+                }
+            },
+            "scheme_rules": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "rule_type": {"type": ["string", "null"]},
+                        "rule_description": {"type": ["string", "null"]},
+                        "rule_value": {"type": ["string", "null"]}
+                    }
+                }
+            }
+        },
+        "required": ["scheme_name", "products"]
+    }
+}
+
 # Extract structured data from text
-def extract_structured_data_from_text(text, document_name, bedrock_client=None, inference_profile_arn=None):
+def extract_structured_data_from_text(text, document_name, bedrock_client=None, inference_profile_arn=None, fallback=True):
     """Extract structured data from text using Claude API or fallback to rule-based extraction"""
     try:
         # If Bedrock client is available, use Claude API
         if bedrock_client and inference_profile_arn:
-            prompt = f"""
-            You are a specialized AI for extracting structured data from mobile phone scheme documents.
-            
-            Document: {document_name}
-            
-            Extract the following information in JSON format:
-            1. scheme_name: The name of the scheme
-            2. scheme_type: Type of scheme (e.g., Special Support, RCM, Upgrade Program)
-            3. scheme_period_start: Start date in YYYY-MM-DD format
-            4. scheme_period_end: End date in YYYY-MM-DD format
-            5. applicable_region: Region where the scheme is applicable
-            6. dealer_type_eligibility: Types of dealers eligible for this scheme
-            7. products: Array of products with these fields:
-               - product_name: Full name of the product
-               - product_code: Product code if available
-               - product_category: Category (e.g., Mobile, Tablet)
-               - product_subcategory: Subcategory (e.g., S Series, A Series)
-               - ram: RAM specification if available
-               - storage: Storage specification if available
-               - connectivity: Connectivity options if available
-               - support_type: Type of support (e.g., Cashback, Exchange)
-               - payout_type: Type of payout (Fixed, Percentage)
-               - payout_amount: Amount of payout
-               - payout_unit: Unit of payout (e.g., INR, %)
-               - dealer_contribution: Dealer's contribution if any
-               - total_payout: Total payout amount
-               - is_bundle_offer: Boolean indicating if it's a bundle offer
-               - bundle_price: Price of the bundle if applicable
-               - is_upgrade_offer: Boolean indicating if it's an upgrade offer
-               - free_item_description: Description of any free items included with the product (e.g., "Galaxy Buds2 Pro", "Galaxy Watch4", etc.)
-            8. scheme_rules: Array of rules with these fields:
-               - rule_type: Type of rule
-               - rule_description: Description of the rule
-               - rule_value: Value or threshold for the rule
-            
-            Here's the document text:
-            {text}
-            
-            Return only the JSON object without any additional text.
-            """
+            prompt = SCHEME_EXTRACTION_PROMPT.format(document_name=document_name, text=text)
             
             payload = {
                 "anthropic_version": "bedrock-2023-05-31",
                 "max_tokens": 4096,
+                "temperature": 0,
+                "tools": [SCHEME_EXTRACTION_TOOL],
+                "tool_choice": {"type": "tool", "name": SCHEME_EXTRACTION_TOOL["name"]},
                 "messages": [
                     {
                         "role": "user",
@@ -404,6 +758,12 @@ def extract_structured_data_from_text(text, document_name, bedrock_client=None,
                     body=json.dumps(payload)
                 )
                 response_body = json.loads(response['body'].read())
+                
+                # The forced tool call carries the data already parsed against the schema
+                for block in response_body['content']:
+                    if block['type'] == 'tool_use':
+                        return block['input']
+                
                 result_text = response_body['content'][0]['text'].strip()
                 
                 # Extract JSON from response
@@ -416,13 +776,20 @@ def extract_structured_data_from_text(text, document_name, bedrock_client=None,
                 return structured_data
             
             except Exception as e:
+                if not fallback:
+                    raise
                 print(f"Error calling Claude API: {e}")
                 # Fall back to rule-based extraction
         
+        if not fallback:
+            raise ValueError("Bedrock client or inference profile is not configured")
+        
         # Rule-based extraction as fallback
         return rule_based_extraction(text, document_name)
     
     except Exception as e:
+        if not fallback:
+            raise
         print(f"Error extracting structured data: {e}")
         return None
 
@@ -632,6 +999,39 @@ def rule_based_extraction(text, document_name):
     
     return structured_data
 
+# Resolve product ids
+def resolve_product_ids(cursor, product_columns, product_rows):
+    """Map (product_name, product_code) to product_id, inserting missing products in one batch"""
+    if not product_rows:
+        return {}
+    
+    # Rows start with product_name and product_code; rows already present are skipped in SQL
+    placeholders = ", ".join("?" * len(product_columns))
+    cursor.executemany(f"""
+    INSERT INTO products ({', '.join(product_columns)})
+    SELECT {placeholders}
+    WHERE NOT EXISTS (
+        SELECT 1 FROM products WHERE product_name = ? AND product_code = ?
+    )
+    """, [row + row[:2] for row in product_rows])
+    
+    names = list({row[0] for row in product_rows})
+    cursor.execute(f"""
+    SELECT product_id, product_name, product_code FROM products
+    WHERE product_name IN ({', '.join('?' * len(names))}) ORDER BY product_id
+    """, names)
+    
+    product_ids = {}
+    for row in cursor.fetchall():
+        product_ids.setdefault((row[1], row[2]), row[0])
+    return product_ids
+
+# Generate IMEI numbers
+def generate_imeis(count):
+    """Generate count random 15-digit IMEI strings in one batch"""
+    digits = np.random.default_rng().integers(ord('0'), ord('9') + 1, size=(count, 15), dtype=np.uint8)
+    return [row.tobytes().decode() for row in digits]
+
 # Add sample data
 def add_sample_data():
     """Add sample data to the database"""
@@ -780,58 +1180,56 @@ def add_sample_data():
         scheme_ids = [row[0] for row in cursor.fetchall()]
         
         if dealer_ids and product_ids and scheme_ids:
-            # Generate sales for the last 30 days
-            end_date = datetime.datetime.now()
-            start_date = end_date - datetime.timedelta(days=30)
+            # Read prices and payouts once instead of querying per sale
+            cursor.execute("SELECT product_id, dealer_price_dp FROM products")
+            dealer_prices = {row[0]: row[1] for row in cursor.fetchall()}
             
-            for _ in range(100):  # Generate 100 random sales
-                dealer_id = random.choice(dealer_ids)
-                product_id = random.choice(product_ids)
-                scheme_id = random.choice(scheme_ids)
-                
-                # Random date in the last 30 days
-                days_ago = random.randint(0, 30)
-                sale_date = end_date - datetime.timedelta(days=days_ago)
-                
-                # Random quantity between 1 and 5
-                quantity = random.randint(1, 5)
-                
-                # Get product price
-                cursor.execute("SELECT dealer_price_dp FROM products WHERE product_id = ?", (product_id,))
-                dealer_price = cursor.fetchone()[0]
-                
-                # Get scheme payout
-                cursor.execute("""
-                SELECT payout_amount FROM scheme_products 
-                WHERE scheme_id = ? AND product_id = ?
-                """, (scheme_id, product_id))
-                
-                payout_row = cursor.fetchone()
-                if payout_row:
-                    payout = payout_row[0]
-                else:
-                    payout = random.randint(500, 3000)  # Default if no specific payout
-                
-                # Calculate incentive
-                incentive = payout * quantity
-                
-                # Random IMEI
-                imei = ''.join([str(random.randint(0, 9)) for _ in range(15)])
-                
-                # Random verification status
-                status = random.choice(['Verified', 'Pending', 'Verified'])
-                
-                cursor.execute('''
-                INSERT INTO sales_transactions (
-                    dealer_id, scheme_id, product_id, quantity_sold,
-                    dealer_price_dp, earned_dealer_incentive_amount,
-                    imei_serial, verification_status, sale_timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
+            cursor.execute("SELECT scheme_id, product_id, payout_amount FROM scheme_products ORDER BY id")
+            scheme_payouts = {}
+            for row in cursor.fetchall():
+                scheme_payouts.setdefault((row[0], row[1]), row[2])
+            
+            # Generate 100 random sales over the last 30 days as arrays
+            sale_count = 100
+            rng = np.random.default_rng()
+            sale_dealers = rng.choice(dealer_ids, sale_count)
+            sale_products = rng.choice(product_ids, sale_count)
+            sale_schemes = rng.choice(scheme_ids, sale_count)
+            days_ago = rng.integers(0, 31, sale_count)
+            quantities = rng.integers(1, 6, sale_count)
+            default_payouts = rng.integers(500, 3001, sale_count)  # Default if no specific payout
+            statuses = rng.choice(['Verified', 'Pending', 'Verified'], sale_count)
+            
+            # Calculate incentives
+            payouts = np.array([
+                scheme_payouts.get((scheme_id, product_id), default_payout)
+                for scheme_id, product_id, default_payout in zip(
+                    sale_schemes.tolist(), sale_products.tolist(), default_payouts.tolist()
+                )
+            ])
+            incentives = payouts * quantities
+            
+            end_date = datetime.datetime.now()
+            sale_rows = [
+                (
                     dealer_id, scheme_id, product_id, quantity,
-                    dealer_price, incentive, imei, status,
-                    sale_date.strftime('%Y-%m-%d %H:%M:%S')
-                ))
+                    dealer_prices[product_id], incentive, imei, status,
+                    (end_date - datetime.timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+                )
+                for dealer_id, scheme_id, product_id, quantity, incentive, imei, status, days in zip(
+                    sale_dealers.tolist(), sale_schemes.tolist(), sale_products.tolist(),
+                    quantities.tolist(), incentives.tolist(), generate_imeis(sale_count),
+                    statuses.tolist(), days_ago.tolist()
+                )
+            ]
+            
+            cursor.executemany('''
+            INSERT INTO sales_transactions (
+                dealer_id, scheme_id, product_id, quantity_sold,
+                dealer_price_dp, earned_dealer_incentive_amount,
+                imei_serial, verification_status, sale_timestamp
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', sale_rows)
         else:
             print("No dealers, products, or schemes found. Cannot add sample sales data.")
         
@@ -841,8 +1239,8 @@ def add_sample_data():
     conn.close()
 
 # Process a single PDF
-def process_pdf(pdf_path):
-    """Process a single PDF file and add to database"""
+def process_pdf(pdf_path, conn=None):
+    """Process a single PDF file and add to database, optionally on a shared connection"""
     try:
         print(f"Processing {os.path.basename(pdf_path)}...")
         
@@ -893,8 +1291,10 @@ def process_pdf(pdf_path):
             print(f"Failed to extract structured data from {os.path.basename(pdf_path)}")
             return False
         
-        # Add to database
-        conn = connect_db()
+        # Add to database, reusing the caller's connection and its prepared statements
+        own_conn = conn is None
+        if own_conn:
+            conn = connect_db()
         cursor = conn.cursor()
         
         try:
@@ -926,7 +1326,9 @@ def process_pdf(pdf_path):
             
             scheme_id = cursor.lastrowid
             
-            # Add products
+            # Normalize products and their scheme fields
+            product_rows = []
+            scheme_product_fields = []
             for product in structured_data.get('products', []):
                 # Normalize product fields
                 product_name = normalize_field(product.get('product_name'), str, f"Product {uuid.uuid4().hex[:8]}")
@@ -939,34 +1341,17 @@ def process_pdf(pdf_path):
                 dealer_price_dp = normalize_field(product.get('dealer_price_dp'), float, random.randint(10000, 100000))
                 mrp = normalize_field(product.get('mrp'), float, random.randint(15000, 120000))
                 
-                # First check if product exists
-                cursor.execute("""
-                SELECT product_id FROM products 
-                WHERE product_name = ? AND product_code = ?
-                """, (product_name, product_code))
-                
-                existing = cursor.fetchone()
-                if existing:
-                    product_id = existing[0]
-                else:
-                    # Add new product
-                    cursor.execute("""
-                    INSERT INTO products (
-                        product_name, product_code, product_category, product_subcategory,
-                        ram, storage, connectivity, dealer_price_dp, mrp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        product_name,
-                        product_code,
-                        product_category,
-                        product_subcategory,
-                        ram,
-                        storage,
-                        connectivity,
-                        dealer_price_dp,
-                        mrp
-                    ))
-                    product_id = cursor.lastrowid
+                product_rows.append((
+                    product_name,
+                    product_code,
+                    product_category,
+                    product_subcategory,
+                    ram,
+                    storage,
+                    connectivity,
+                    dealer_price_dp,
+                    mrp
+                ))
                 
                 # Normalize scheme product fields
                 support_type = normalize_field(product.get('support_type'), str, scheme_type)
@@ -982,16 +1367,7 @@ def process_pdf(pdf_path):
                 is_slab_based = 1 if product.get('is_slab_based', False) else 0
                 free_item_description = normalize_field(product.get('free_item_description'), str)
                 
-                # Add scheme product
-                cursor.execute("""
-                INSERT INTO scheme_products (
-                    scheme_id, product_id, support_type, payout_type, payout_amount,
-                    payout_unit, dealer_contribution, total_payout, is_dealer_incentive,
-                    is_bundle_offer, bundle_price, is_upgrade_offer, is_slab_based, free_item_description
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    scheme_id,
-                    product_id,
+                scheme_product_fields.append((
                     support_type,
                     payout_type,
                     payout_amount,
@@ -1006,23 +1382,38 @@ def process_pdf(pdf_path):
                     free_item_description
                 ))
             
+            # Reuse existing products and add the new ones in one batch
+            product_ids = resolve_product_ids(cursor, [
+                'product_name', 'product_code', 'product_category', 'product_subcategory',
+                'ram', 'storage', 'connectivity', 'dealer_price_dp', 'mrp'
+            ], product_rows)
+            
+            # Add scheme products
+            cursor.executemany("""
+            INSERT INTO scheme_products (
+                scheme_id, product_id, support_type, payout_type, payout_amount,
+                payout_unit, dealer_contribution, total_payout, is_dealer_incentive,
+                is_bundle_offer, bundle_price, is_upgrade_offer, is_slab_based, free_item_description
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (scheme_id, product_ids[(row[0], row[1])]) + fields
+                for row, fields in zip(product_rows, scheme_product_fields)
+            ])
+            
             # Add rules
-            for rule in structured_data.get('scheme_rules', []):
-                # Normalize rule fields
-                rule_type = normalize_field(rule.get('rule_type'), str, 'General')
-                rule_description = normalize_field(rule.get('rule_description'), str, 'No description')
-                rule_value = normalize_field(rule.get('rule_value'), str)
-                
-                cursor.execute("""
-                INSERT INTO scheme_rules (
-                    scheme_id, rule_type, rule_description, rule_value
-                ) VALUES (?, ?, ?, ?)
-                """, (
+            cursor.executemany("""
+            INSERT INTO scheme_rules (
+                scheme_id, rule_type, rule_description, rule_value
+            ) VALUES (?, ?, ?, ?)
+            """, [
+                (
                     scheme_id,
-                    rule_type,
-                    rule_description,
-                    rule_value
-                ))
+                    normalize_field(rule.get('rule_type'), str, 'General'),
+                    normalize_field(rule.get('rule_description'), str, 'No description'),
+                    normalize_field(rule.get('rule_value'), str)
+                )
+                for rule in structured_data.get('scheme_rules', [])
+            ])
             
             conn.commit()
             print(f"Added scheme from {os.path.basename(pdf_path)} to database")
@@ -1034,7 +1425,8 @@ def process_pdf(pdf_path):
             return False
         
         finally:
-            conn.close()
+            if own_conn:
+                conn.close()
     
     except Exception as e:
         print(f"Failed to process {os.path.basename(pdf_path)}: {e}")
@@ -1063,13 +1455,17 @@ def process_multiple_pdfs(directory):
     # Add sample dealers
     add_sample_data()
     
-    # Process each PDF
+    # Process each PDF on one connection so inserts reuse prepared statements
+    conn = connect_db()
+    
     for pdf_file in pdf_files:
         pdf_path = os.path.join(pdf_dir, pdf_file)
-        success = process_pdf(pdf_path)
+        success = process_pdf(pdf_path, conn)
         
         if not success:
             print(f"Failed to process {pdf_file}")
+    
+    conn.close()
 
 # Main function
 if __name__ == "__main__":
@@ -68,6 +68,12 @@ def setup_environment():
                 add_sample_data()
                 return
         
+        # Add any missing indexes to the existing database
+        from pdf_processor_fixed import create_indexes, create_sales_summaries
+        create_indexes(cursor)
+        create_sales_summaries(cursor)
+        conn.commit()
+        
         conn.close()
     else:
         # Create new database with tables